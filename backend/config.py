@@ -7,6 +7,14 @@ class Settings(BaseSettings):
     DB_HOST: str = "localhost"
     DB_PORT: int = 3306
     DB_NAME: str = "pest_detection_db"
+    DATABASE_URL: str = ""  # 留空则按 DB_* 拼出 MySQL 地址；本地调试可用 sqlite:///./pest_local.db（异步引擎需安装 aiosqlite）
+
+    # Connection pool (同步引擎供后台线程 / 迁移使用，异步引擎供异步路由使用，两者各有一个连接池)
+    DB_POOL_SIZE: int = 10  # 常驻连接数
+    DB_MAX_OVERFLOW: int = 20  # 高峰时额外创建的连接数
+    DB_POOL_TIMEOUT: float = 30.0  # 等待空闲连接的最长时间（秒）
+    DB_POOL_RECYCLE: int = 1800  # 连接最长使用时间（秒），应小于 MySQL 的 wait_timeout
+    DB_POOL_PRE_PING: bool = True  # 取出连接时先探测，丢弃已被服务端断开的连接
 
     # Security
     SECRET_KEY: str = "your-super-secret-key-change-me"
@@ -16,6 +24,85 @@ class Settings(BaseSettings):
     # Paths
     MODEL_PATH: str = "runs/agropest_yolov8n2/weights/best.pt"
     UPLOAD_DIR: str = "uploads"
+    # 图片检测时是否保存原图 / 标注图（在响应返回后异步写盘）
+    SAVE_UPLOAD_ORIGINAL: bool = True
+    SAVE_ANNOTATED_IMAGE: bool = True
+    # 标注图渲染方式：eager 上传时即画框保存；deferred 只保存检测框，首次请求 /detection/{id}/annotated 时再渲染
+    RENDER_MODE: str = "eager"
+
+    # Inference engine: "torch" (.pt), "onnx" (ONNX Runtime) or "openvino"
+    # "onnx_int8" / "openvino_int8" 使用 `python test1.py quantize` 生成的 INT8 模型
+    # 非 torch 引擎会自动从 MODEL_PATH 导出并缓存到 ENGINE_CACHE_DIR（留空则与权重同目录）
+    INFERENCE_ENGINE: str = "torch"
+    ENGINE_CACHE_DIR: str = ""
+    INFERENCE_IMGSZ: int = 640  # 推理/导出使用的输入尺寸
+    INFERENCE_CONF: float = 0.25  # 未指定时的置信度阈值（与 ultralytics 默认值相同）
+    MODEL_WARMUP_RUNS: int = 2  # 启动时的预热推理次数，预热完成后 /ready 才返回 200
+    # Model registry (运行时加载新权重并切换，无需重启)
+    MODEL_DIRS: str = "runs"  # 允许加载权重的目录，逗号分隔
+    MODEL_RETIRE_TIMEOUT: float = 300.0  # 旧模型等待处理中请求结束时，每隔该时间（秒）记录一次警告；请求结束前不会释放
+
+    # Detection result cache (按图片内容哈希缓存检测结果)
+    RESULT_CACHE_MAX_MB: float = 64  # 内存 LRU 容量，0 表示关闭缓存
+    RESULT_CACHE_DIR: str = ""  # 磁盘缓存目录，留空则只使用内存
+
+    # Tiled inference (高分辨率图片切成重叠小块按原分辨率推理，避免小目标被缩没)
+    TILE_SIZE: int = 0  # 默认切片边长，0 表示不切片；上传接口可按请求指定
+    TILE_OVERLAP: float = 0.2  # 相邻切片重叠比例
+    TILE_INCLUDE_FULL: bool = True  # 额外推理一次缩小后的整图，找回跨越多个切片的大目标
+    TILE_NMS_METRIC: str = "ios"  # 跨切片去重的重叠度：ios（交集 / 较小框面积）或 iou
+    TILE_NMS_THRESHOLD: float = 0.5
+
+    # Inference batching (并发请求合并为一次批量前向计算)
+    BATCH_MAX_SIZE: int = 8  # 单批最多合并的图片数
+    BATCH_MAX_WAIT_MS: float = 10.0  # 收到首个请求后等待凑批的最长时间（毫秒）
+
+    # Video sampling (视频检测的关键帧采样)
+    VIDEO_SAMPLE_FPS: float = 1.0  # 每秒采样帧数
+    VIDEO_SAMPLE_INTERVAL: float = 0.0  # 采样间隔（秒），大于 0 时优先于 VIDEO_SAMPLE_FPS
+    VIDEO_SEEK_MIN_GAP: int = 20  # 采样间隔超过该帧数时 seek 而非逐帧 grab，0 表示不 seek（默认 1 fps 采样、24 fps 以上的视频即会 seek）
+    VIDEO_BATCH_SIZE: int = 8  # 每次送入模型的采样帧数
+    # 关键帧之间用 IoU 跟踪关联同一目标，按唯一目标计数
+    TRACKER_IOU_THRESHOLD: float = 0.2  # 预测框与检测框的最小 IoU（采样越稀疏、目标移动越快，应越小）
+    TRACKER_MAX_MISSED: int = 2  # 轨迹允许连续丢失的关键帧数
+    TRACKER_MIN_HITS: int = 1  # 轨迹至少出现在几个关键帧中才计数
+    VIDEO_JOB_WORKERS: int = 2  # 同时处理的视频任务数
+    VIDEO_JOB_MAX_ATTEMPTS: int = 2  # 服务重启后任务最多重新执行的次数，超过则标记失败
+    VIDEO_JOB_HEARTBEAT_INTERVAL: float = 15.0  # 刷新本进程任务心跳、检查超时任务的间隔（秒）
+    VIDEO_JOB_STALE_AFTER: float = 60.0  # 心跳超过该时间未更新的任务由其他进程接管（秒）
+
+    # Live stream (每个视频源只采集、推理、编码一次，广播给所有观看者)
+    STREAM_SOURCES: str = "0"  # 允许的视频源，逗号分隔：摄像头编号或流地址，第一个为默认值
+    STREAM_RING_SIZE: int = 4  # 每个视频源缓存的最近帧数
+    # 自适应控制：按实测推理耗时调整推理间隔和推理尺寸
+    STREAM_TARGET_LATENCY_MS: float = 150.0  # 单帧处理延迟目标
+    STREAM_TARGET_FPS: float = 0.0  # 输出帧率目标，0 表示使用摄像头帧率
+    STREAM_IMGSZ_LADDER: str = "640,512,416,320"  # 可选推理尺寸
+    STREAM_MAX_STRIDE: int = 5  # 最多每几帧推理一次，中间帧复用上一次的检测框
+    # WebSocket 检测流：随检测结果附带的原始画面关键帧
+    STREAM_KEYFRAME_INTERVAL: float = 1.0  # 关键帧间隔（秒），0 表示不发送
+    STREAM_KEYFRAME_QUALITY: int = 70  # 关键帧 JPEG 质量
+
+    # JPEG encoding (实时流、关键帧、标注图片分别配置质量和色度抽样：444 / 422 / 420 / gray)
+    JPEG_ENCODER: str = "auto"  # auto / turbojpeg / opencv，auto 在安装了 PyTurboJPEG 时使用 libjpeg-turbo
+    JPEG_STREAM_QUALITY: int = 80  # MJPEG 实时流
+    JPEG_STREAM_SUBSAMPLING: str = "420"
+    JPEG_STREAM_TARGET_KB: float = 0.0  # 实时流单帧目标大小（KB），大于 0 时按帧大小自适应降低质量
+    JPEG_KEYFRAME_SUBSAMPLING: str = "420"  # WebSocket 关键帧（质量见 STREAM_KEYFRAME_QUALITY）
+    JPEG_ANNOTATED_QUALITY: int = 90  # 保存的标注图片
+    JPEG_ANNOTATED_SUBSAMPLING: str = "444"
+
+    # Inference executor (推理在线程池中执行，不阻塞事件循环)
+    INFERENCE_WORKERS: int = 4  # 同时执行的推理任务数
+    INFERENCE_QUEUE_SIZE: int = 32  # 排队上限，超出后返回 503
+
+    # Forum
+    FORUM_COMMENTS_PER_POST: int = 5  # 帖子列表中每个帖子附带的最新评论数，其余通过评论分页接口获取
+
+    # Admin statistics (统计计数器随注册 / 检测在同一事务中更新，定期与实际数据核对)
+    # 是否在应用进程内运行核对线程；多 worker 部署时只在一个进程开启，或保持关闭并用 cron 执行 python -m backend.services.stats_counters
+    STATS_RECONCILER: bool = False
+    STATS_RECONCILE_INTERVAL: float = 3600.0  # 进程内核对的间隔（秒），0 表示只在启动时核对一次
 
     # Email Configuration (单邮箱配置 - 向后兼容)
     SMTP_HOST: str = "smtp.gmail.com"  # 默认使用Gmail，可在.env中修改
@@ -9,10 +9,21 @@ project_root = current_file.parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
+from contextlib import asynccontextmanager
+import asyncio
+import time
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from backend.database import engine, Base
+from backend.config import settings
+from backend.database import engine, async_engine, Base
+from backend.services.yolo_service import yolo_service
+from backend.services.inference_executor import inference_executor
+from backend.services.video_jobs import video_job_manager
+from backend.services.stream_hub import stream_hub
+from backend.services.metrics import registry as metrics_registry, HTTP_REQUEST_SECONDS
+from backend.services.stats_counters import StatsReconciler
 import logging
 
 # 配置日志
@@ -22,14 +33,43 @@ logger = logging.getLogger(__name__)
 # Create Database Tables
 # Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Pest Detection API")
+stats_reconciler = StatsReconciler(engine, interval=settings.STATS_RECONCILE_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时在后台加载模型并预热，完成前 /ready 返回 503，/health 不受影响；并恢复未完成的视频任务"""
+    load_task = asyncio.create_task(asyncio.to_thread(yolo_service.startup))
+    try:
+        await asyncio.to_thread(video_job_manager.start)
+    except Exception as e:
+        logger.error(f"恢复视频任务失败: {e}")
+    if settings.STATS_RECONCILER:
+        stats_reconciler.start()
+    yield
+    stats_reconciler.stop()
+    await async_engine.dispose()
+    load_task.cancel()
+    video_job_manager.shutdown()
+    stream_hub.stop_all()
+    inference_executor.shutdown(wait=False)
+
+app = FastAPI(title="Pest Detection API", lifespan=lifespan)
 
 # 添加请求日志中间件
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """记录所有HTTP请求"""
     logger.info(f"📥 收到请求: {request.method} {request.url.path}")
+    start = time.perf_counter()
     response = await call_next(request)
+    # 按路由模板（/api/detection/{detection_id}）统计，避免每个 id 一组标签
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
     logger.info(f"📤 响应状态: {response.status_code} for {request.method} {request.url.path}")
     return response
 
@@ -40,6 +80,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"], # Keyset pagination cursor
 )
 
 @app.get("/")
@@ -56,6 +97,44 @@ async def health_check_api():
     """健康检查端点 - 带/api前缀"""
     return {"message": "API is working!", "status": "ok", "path": "/api/health"}
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查端点：模型加载并预热完成后返回 200，否则返回 503"""
+    model_status = yolo_service.status()
+    if model_status["state"] != "ready":
+        return JSONResponse(status_code=503, content=model_status)
+    return model_status
+
+# 采集时读取的队列深度 / 在线人数
+metrics_registry.gauge(
+    "pest_batch_queue_depth",
+    "Requests waiting in each model's micro-batcher",
+    ["model"],
+    callback=lambda: {h.name: h.batcher.qsize() for h in yolo_service.registry.handles()},
+)
+metrics_registry.gauge(
+    "pest_model_inflight",
+    "Requests currently using each model",
+    ["model"],
+    callback=lambda: {h.name: h.inflight for h in yolo_service.registry.handles()},
+)
+metrics_registry.gauge(
+    "pest_inference_pending",
+    "Inference calls running or queued in the bounded executor",
+    callback=lambda: inference_executor.pending,
+)
+metrics_registry.gauge(
+    "pest_stream_viewers",
+    "Connected viewers per camera stream",
+    ["source"],
+    callback=stream_hub.viewers,
+)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # Import routers
 
 from backend.routers import auth, detection, forum, users, admin, password_reset, test
@@ -0,0 +1,32 @@
+"""
+数据库迁移
+每个迁移模块提供 upgrade(conn)，迁移必须是幂等的（已存在的列/索引/表直接跳过），
+因此无论是 init_db.py 新建的库还是旧库，都可以反复执行 migrate_db.py
+"""
+from sqlalchemy import inspect, text
+
+
+def has_column(conn, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def has_index(conn, table: str, index: str) -> bool:
+    return any(i["name"] == index for i in inspect(conn).get_indexes(table))
+
+
+def has_table(conn, table: str) -> bool:
+    return inspect(conn).has_table(table)
+
+
+def add_column(conn, table: str, column: str, ddl: str):
+    """列不存在时执行 ALTER TABLE ... ADD COLUMN"""
+    if not has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        print(f"  + {table}.{column}")
+
+
+def add_index(conn, table: str, index: str, columns):
+    """索引不存在时执行 CREATE INDEX"""
+    if not has_index(conn, table, index):
+        conn.execute(text(f"CREATE INDEX {index} ON {table} ({', '.join(columns)})"))
+        print(f"  + {table}.{index}")
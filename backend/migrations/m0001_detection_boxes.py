@@ -0,0 +1,7 @@
+"""detections 增加逐框结果与按需渲染的标注图路径"""
+from backend.migrations import add_column
+
+
+def upgrade(conn):
+    add_column(conn, "detections", "boxes_json", "JSON NULL")
+    add_column(conn, "detections", "annotated_path", "VARCHAR(255) NULL")
@@ -0,0 +1,6 @@
+"""新增 video_jobs 表（后台视频检测任务）"""
+from backend.models import VideoJob
+
+
+def upgrade(conn):
+    VideoJob.__table__.create(conn, checkfirst=True)
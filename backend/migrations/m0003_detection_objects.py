@@ -0,0 +1,46 @@
+"""新增 detection_objects 表（每个检测目标一行），并从已有检测记录回填"""
+from sqlalchemy import exists, select
+
+from backend.models import Detection, DetectionObject
+from backend.services.detection_objects import insert_objects, object_rows
+
+BATCH = 500
+
+
+def upgrade(conn):
+    DetectionObject.__table__.create(conn, checkfirst=True)
+
+    # 只回填还没有明细行的检测记录，重复执行不会重复写入
+    detections = Detection.__table__
+    objects = DetectionObject.__table__
+    query = (
+        select(
+            detections.c.id,
+            detections.c.user_id,
+            detections.c.created_at,
+            detections.c.result_json,
+            detections.c.boxes_json,
+        )
+        .where(~exists().where(objects.c.detection_id == detections.c.id))
+        .order_by(detections.c.id)
+    )
+    last_id, total_rows, total_detections = 0, 0, 0
+    while True:
+        batch = conn.execute(query.where(detections.c.id > last_id).limit(BATCH)).all()
+        if not batch:
+            break
+        rows = []
+        for det in batch:
+            # 逐框结果（m0001 之后的图片检测）优先，否则按 result_json 中的计数展开
+            rows.extend(object_rows(
+                det.id,
+                det.user_id,
+                detections=det.boxes_json if isinstance(det.boxes_json, list) else None,
+                class_counts=det.result_json if isinstance(det.result_json, dict) else None,
+                created_at=det.created_at,
+            ))
+        total_rows += insert_objects(conn, rows)
+        total_detections += len(batch)
+        last_id = batch[-1].id
+    if total_detections:
+        print(f"  + detection_objects: {total_rows} rows from {total_detections} detections")
@@ -0,0 +1,10 @@
+"""新增 stat_counters / stat_daily 汇总表，并按已有数据计算初始值"""
+from backend.models import StatCounter, StatDaily
+from backend.services.stats_counters import reconcile
+
+
+def upgrade(conn):
+    StatCounter.__table__.create(conn, checkfirst=True)
+    StatDaily.__table__.create(conn, checkfirst=True)
+    result = reconcile(conn)
+    print(f"  + stat_counters: {result['counters']} rows, stat_daily: {result['daily']} rows")
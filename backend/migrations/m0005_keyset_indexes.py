@@ -0,0 +1,9 @@
+"""游标分页使用的组合索引（列表按 created_at, id 倒序）"""
+from backend.migrations import add_index
+
+
+def upgrade(conn):
+    add_index(conn, "detections", "ix_detections_user_created", ["user_id", "created_at"])
+    add_index(conn, "posts", "ix_posts_created", ["created_at"])
+    add_index(conn, "comments", "ix_comments_post_created", ["post_id", "created_at"])
+    add_index(conn, "likes", "ix_likes_post_user", ["post_id", "user_id"])
@@ -0,0 +1,7 @@
+"""video_jobs 增加所属进程与心跳时间，多进程部署时只接管心跳超时的任务"""
+from backend.migrations import add_column
+
+
+def upgrade(conn):
+    add_column(conn, "video_jobs", "worker_id", "VARCHAR(64) NULL")
+    add_column(conn, "video_jobs", "heartbeat_at", "DATETIME NULL")
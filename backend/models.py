@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, ForeignKey, Boolean, JSON, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from backend.database import Base
@@ -37,10 +37,60 @@ class Detection(Base):
     image_path = Column(String(255), nullable=True)
     video_path = Column(String(255), nullable=True)
     result_json = Column(JSON, nullable=True) # Stores detection counts, boxes, etc.
+    boxes_json = Column(JSON, nullable=True) # Per-object class / confidence / box, image detections only
+    annotated_path = Column(String(255), nullable=True) # Rendered image with boxes, may be created on demand
     detection_type = Column(String(20)) # 'image', 'video', 'stream'
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     owner = relationship("User", back_populates="detections")
+    objects = relationship("DetectionObject", back_populates="detection", cascade="all, delete-orphan")
+
+    # History pages: WHERE user_id = ? ORDER BY created_at DESC, id DESC (InnoDB appends the primary key)
+    __table_args__ = (
+        Index("ix_detections_user_created", "user_id", "created_at"),
+    )
+
+class DetectionObject(Base):
+    """One row per detected object, the source for per-pest statistics"""
+    __tablename__ = "detection_objects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    detection_id = Column(Integer, ForeignKey("detections.id"), nullable=False, index=True)
+    # Copied from the detection so GROUP BY queries don't need a join
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    class_name = Column(String(50), nullable=False, index=True)
+    confidence = Column(Float, nullable=True) # NULL for video detections, which only keep tracked counts
+    x1 = Column(Float, nullable=True)
+    y1 = Column(Float, nullable=True)
+    x2 = Column(Float, nullable=True)
+    y2 = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    detection = relationship("Detection", back_populates="objects")
+
+    __table_args__ = (
+        Index("ix_detection_objects_created_class", "created_at", "class_name"),
+        Index("ix_detection_objects_user_class", "user_id", "class_name"),
+    )
+
+class VideoJob(Base):
+    __tablename__ = "video_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    video_path = Column(String(255), nullable=False)
+    status = Column(String(20), index=True, default="queued") # 'queued', 'running', 'completed', 'failed', 'cancelled'
+    frames_total = Column(Integer, default=0) # Expected number of sampled frames, 0 if unknown
+    frames_processed = Column(Integer, default=0)
+    attempts = Column(Integer, default=0)
+    result_json = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    detection_id = Column(Integer, ForeignKey("detections.id"), nullable=True) # Written when the job completes
+    worker_id = Column(String(64), nullable=True) # Process that owns the job, see backend/services/video_jobs.py
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True) # Refreshed by the owner; stale jobs are taken over
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
 
 class Post(Base):
     __tablename__ = "posts"
@@ -55,6 +105,10 @@ class Post(Base):
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     likes = relationship("Like", back_populates="post", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_posts_created", "created_at"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -67,6 +121,11 @@ class Comment(Base):
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
 
+    # Latest comments per post / comment pages
+    __table_args__ = (
+        Index("ix_comments_post_created", "post_id", "created_at"),
+    )
+
 class Like(Base):
     __tablename__ = "likes"
 
@@ -77,6 +136,28 @@ class Like(Base):
     post = relationship("Post", back_populates="likes")
     user = relationship("User", back_populates="likes")
 
+    # Like counts per post and the like / unlike lookup
+    __table_args__ = (
+        Index("ix_likes_post_user", "post_id", "user_id"),
+    )
+
+class StatCounter(Base):
+    """Running totals for the admin dashboard, see backend/services/stats_counters.py"""
+    __tablename__ = "stat_counters"
+
+    name = Column(String(30), primary_key=True) # 'users', 'detections', 'objects', 'user_total', 'user_objects', 'confidence_sum', 'confidence_count'
+    key = Column(String(100), primary_key=True, default="") # Class name / user id, '' for plain totals
+    value = Column(BigInteger, nullable=False, default=0)
+
+class StatDaily(Base):
+    """Per-day rollups ('detections' with key '', 'objects' per class name)"""
+    __tablename__ = "stat_daily"
+
+    day = Column(Date, primary_key=True)
+    name = Column(String(30), primary_key=True)
+    key = Column(String(100), primary_key=True, default="")
+    value = Column(BigInteger, nullable=False, default=0)
+
 class VerificationCode(Base):
     __tablename__ = "verification_codes"
 
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 
 from backend.database import get_db
 from backend.models import User, PestInfo
-from backend.schemas import PestInfoCreate, PestInfoResponse, UserResponse
+from backend.schemas import PestInfoCreate, PestInfoResponse, UserResponse, ModelLoadRequest, ModelAbRequest
+from backend.services.yolo_service import yolo_service
+from backend.services.model_registry import available_weights, resolve_weights_path
+from backend.services.stats_counters import snapshot
 from backend.dependencies import get_current_admin_user, get_current_active_user
 
 router = APIRouter(prefix="/admin", tags=["admin"])
@@ -72,28 +75,18 @@ def delete_pest_info(
     db.commit()
     return {"message": "删除成功"}
 
-from sqlalchemy import func
-from backend.models import User, PestInfo, Detection
-
 @router.get("/stats")
 def get_stats(
+    days: int = Query(30, ge=1, le=366),
+    top_users: int = Query(10, ge=0, le=100),
     current_user: User = Depends(get_current_admin_user),
     db: Session = Depends(get_db)
 ):
-    total_users = db.query(User).count()
-    total_detections = db.query(Detection).count()
-    
-    # Group by pest type (This is a simplification, assuming result_json holds the main class or we parse it)
-    # Ideally we query the JSON, but MySQL JSON querying can be complex. 
-    # For this demo, we just return raw counts or mock data if JSON parsing is too complex for simple SQL.
-    # A better approach for production: normalize detection results into a separate table.
-    
-    # Simple approach: return total counts.
-    
-    return {
-        "total_users": total_users,
-        "total_detections": total_detections,
-    }
+    """
+    Totals plus per-pest, per-day and per-user breakdowns, read from the stat_counters /
+    stat_daily summary tables so the cost doesn't grow with the detection history.
+    """
+    return snapshot(db, days=days, top_users=top_users)
 
 @router.get("/users", response_model=List[UserResponse])
 def get_all_users(
@@ -102,6 +95,55 @@ def get_all_users(
 ):
     return db.query(User).all()
 
+# Model registry: load new weights in the background, A/B them, swap without a restart
+@router.get("/models")
+def get_models(current_user: User = Depends(get_current_admin_user)):
+    stats = yolo_service.registry.stats()
+    stats["available"] = available_weights()
+    return stats
+
+@router.post("/models/load", status_code=202)
+def load_model(request: ModelLoadRequest, current_user: User = Depends(get_current_admin_user)):
+    try:
+        weights_path = resolve_weights_path(request.weights_path)
+        handle = yolo_service.registry.load(
+            weights_path,
+            engine_name=request.engine,
+            ab_percent=request.ab_percent,
+            promote=request.promote,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return handle.status()
+
+@router.post("/models/promote")
+def promote_model(current_user: User = Depends(get_current_admin_user)):
+    try:
+        handle = yolo_service.registry.promote()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return handle.status()
+
+@router.put("/models/ab")
+def set_model_ab(request: ModelAbRequest, current_user: User = Depends(get_current_admin_user)):
+    try:
+        yolo_service.registry.set_ab_percent(request.percent)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return yolo_service.registry.stats()
+
+@router.delete("/models/candidate")
+def drop_candidate_model(current_user: User = Depends(get_current_admin_user)):
+    try:
+        dropped = yolo_service.registry.drop_candidate()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not dropped:
+        raise HTTPException(status_code=404, detail="No candidate model")
+    return {"message": "Candidate model dropped"}
+
 @router.get("/health")
 async def health_check():
     return {"message": "Admin routes are working!", "status": "ok"}
@@ -1,23 +1,27 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 
-from backend.database import get_db
+from backend.database import get_async_db
 from backend.models import User
 from backend.schemas import UserCreate, Token, UserResponse
 from backend.auth import get_password_hash, verify_password, create_access_token
 from backend.config import settings
+from backend.services.stats_counters import record_user
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.username == user.username).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
+    # bcrypt is deliberately slow, keep it off the event loop
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     new_user = User(
         username=user.username,
         email=user.email,
@@ -25,14 +29,15 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         is_admin=False # Default to regular user
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.run_sync(record_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(User.username == form_data.username))
+    if not user or not await asyncio.to_thread(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -1,138 +1,312 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-import shutil
+from typing import List, Optional
 import os
 import cv2
 import json
+from datetime import datetime
 
-from backend.database import get_db
-from backend.models import User, Detection
-from backend.schemas import DetectionResponse
-from backend.dependencies import get_current_active_user
-from backend.services.yolo_service import yolo_service
+from backend.database import get_db, get_async_db
+from backend.models import User, Detection, VideoJob
+from backend.schemas import DetectionResponse, VideoJobResponse
+from backend.dependencies import get_current_active_user, get_current_active_user_async, get_current_admin_user
+from backend.services.yolo_service import yolo_service, save_bytes, save_image, annotated_path_for, upload_path_for
+from backend.services.stream_hub import stream_hub, WEBSOCKET
+from backend.services import stream_protocol
+from backend.services.video_jobs import video_job_manager, job_progress, mark_cancelled, ACTIVE_STATUSES
+from backend.services.inference_executor import inference_executor, InferenceQueueFull
+from backend.services.metrics import stage_timer, count_detections
+from backend.services.detection_objects import record_detection
+from backend.services.pagination import keyset_query, split_page, NEXT_CURSOR_HEADER
 from backend.config import settings
 
 router = APIRouter(prefix="/detection", tags=["detection"])
 
+async def run_inference(fn, *args):
+    """Run a blocking inference call on the inference pool without blocking the event loop"""
+    try:
+        return await inference_executor.run(fn, *args)
+    except InferenceQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, please retry later",
+            headers={"Retry-After": "1"},
+        )
+
 @router.post("/upload", response_model=DetectionResponse)
 async def upload_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    render: Optional[bool] = None,
+    tile_size: Optional[int] = Query(None, ge=0, le=4096),
+    tile_overlap: Optional[float] = Query(None, ge=0, le=0.5),
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # Save uploaded file
-    file_location = os.path.join(settings.UPLOAD_DIR, file.filename)
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # render=False stores only the boxes, see GET /detection/{id}/annotated
+    if render is None:
+        render = settings.RENDER_MODE == "eager"
+    # tile_size > 0 slices large images into overlapping tiles, 0 disables tiling
+    if tile_size and tile_size < 160:
+        raise HTTPException(status_code=400, detail="tile_size must be 0 or at least 160")
+    
+    # Decode the upload in memory, no disk round-trip before inference
+    contents = await file.read()
+    
+    # End the auth lookup's transaction so no pooled connection is held during inference
+    await db.commit()
     
     # Process with YOLO
     try:
-        result = yolo_service.predict_image(file_location)
+        result = await run_inference(
+            yolo_service.predict_bytes, contents, file.filename, render, tile_size, tile_overlap
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
     
+    # The image returned as image_path is written before responding (the client loads it right away),
+    # the other copy after the response has been sent
+    file_location = upload_path_for(file.filename, contents)
+    image_path = None
+    annotated_path = None
+    writes = []
+    if settings.SAVE_UPLOAD_ORIGINAL or not render: # Deferred rendering draws onto the original later
+        writes.append((file_location, save_bytes, contents))
+        image_path = file_location
+    if render and settings.SAVE_ANNOTATED_IMAGE:
+        if result["annotated"] is not None: # None on a cache hit, the file already exists
+            writes.append((result["output_path"], save_image, result["annotated"]))
+        annotated_path = result["output_path"]
+        image_path = annotated_path # Prefer the annotated image
+    for path, write, data in writes:
+        if path == image_path:
+            await run_in_threadpool(write, path, data)
+        else:
+            background_tasks.add_task(write, path, data)
+    
     # Save to DB
     db_detection = Detection(
         user_id=current_user.id,
-        image_path=result["output_path"], # Save path to annotated image
+        image_path=image_path,
+        annotated_path=annotated_path,
         detection_type="image",
-        result_json=result["counts"]
+        result_json=result["counts"],
+        boxes_json=result["detections"]
     )
     db.add(db_detection)
-    db.commit()
-    db.refresh(db_detection)
+    with stage_timer("db_commit"):
+        # Object rows / counters are written by the shared sync helper on the async connection
+        await db.run_sync(record_detection, db_detection, detections=result["detections"])
+        await db.commit()
+    await db.refresh(db_detection)
+    count_detections(result["counts"], source="image")
     
     return db_detection
 
+@router.get("/cache/stats")
+def get_cache_stats(current_user: User = Depends(get_current_admin_user)):
+    """Result cache hit / miss counters"""
+    return yolo_service.cache.stats()
+
 @router.get("/history", response_model=List[DetectionResponse])
-def get_history(
-    skip: int = 0, 
-    limit: int = 100, 
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+async def get_history(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    detections = db.query(Detection).filter(Detection.user_id == current_user.id).order_by(Detection.created_at.desc()).offset(skip).limit(limit).all()
+    """Newest first. Pass the X-Next-Cursor header of one page as `cursor` to get the next; `skip` still works."""
+    try:
+        query = keyset_query(
+            select(Detection).where(Detection.user_id == current_user.id),
+            Detection.created_at, Detection.id, limit, cursor=cursor, skip=skip,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows = (await db.scalars(query)).all()
+    detections, next_cursor = split_page(rows, Detection.created_at, Detection.id, limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return detections
 
 # Camera Streaming Logic
-def generate_frames():
-    camera = cv2.VideoCapture(0) # Open default camera
-    while True:
-        success, frame = camera.read()
-        if not success:
-            break
-        
-        # YOLO Inference
-        annotated_frame = yolo_service.predict_video_frame(frame)
-        
-        ret, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-    camera.release()
+def resolve_stream_source(source: Optional[str]) -> str:
+    allowed = [s.strip() for s in settings.STREAM_SOURCES.split(",") if s.strip()]
+    if source is None:
+        return allowed[0]
+    if source not in allowed:
+        raise HTTPException(status_code=404, detail="Unknown stream source")
+    return source
 
-@router.post("/upload_video", response_model=DetectionResponse)
+async def generate_frames(source: str):
+    # All viewers of a source share one capture / inference / encode loop
+    subscription = stream_hub.subscribe(source)
+    try:
+        while True:
+            packet = await subscription.next()
+            if packet is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + packet.jpeg + b'\r\n')
+    finally:
+        subscription.close()
+
+def job_response(job: VideoJob) -> VideoJobResponse:
+    return VideoJobResponse(
+        id=job.id,
+        status=job.status,
+        video_path=job.video_path,
+        frames_total=job.frames_total or 0,
+        frames_processed=job.frames_processed or 0,
+        result_json=job.result_json,
+        detection_id=job.detection_id,
+        error=job.error,
+        created_at=job.created_at,
+        **job_progress(job)
+    )
+
+def get_user_job(job_id: int, current_user: User, db: Session) -> VideoJob:
+    job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return job
+
+@router.post("/upload_video", response_model=VideoJobResponse, status_code=202)
 async def upload_video(
     file: UploadFile = File(...),
+    current_user: User = Depends(get_current_active_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Save uploaded video, copied on the threadpool so a large upload doesn't block the event loop
+    file_location = os.path.join(settings.UPLOAD_DIR, file.filename)
+    await run_in_threadpool(save_bytes, file_location, file.file)
+    
+    # Process in the background, the Detection row is written when the job completes
+    job = VideoJob(
+        user_id=current_user.id, video_path=file_location, status="queued",
+        worker_id=video_job_manager.worker_id, heartbeat_at=datetime.utcnow(),
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    video_job_manager.submit(job.id)
+    
+    return job_response(job)
+
+@router.get("/jobs/{job_id}", response_model=VideoJobResponse)
+def get_video_job(
+    job_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    # Save uploaded video
-    file_location = os.path.join(settings.UPLOAD_DIR, file.filename)
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    return job_response(get_user_job(job_id, current_user, db))
+
+@router.post("/jobs/{job_id}/cancel", response_model=VideoJobResponse)
+def cancel_video_job(
+    job_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    job = get_user_job(job_id, current_user, db)
+    if job.status not in ACTIVE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Job is already {job.status}")
     
-    # Process video with YOLO (process key frames)
+    # The status is written to the DB, so a job running in another worker process stops after its
+    # current batch too; a job in this process is also signalled directly
+    video_job_manager.cancel(job.id)
+    mark_cancelled(db, job.id)
+    db.commit()
+    db.refresh(job)
+    return job_response(job)
+
+@router.get("/{detection_id}/annotated")
+def get_annotated_image(
+    detection_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Annotated image of a detection, rendered from the stored boxes on first request and then cached"""
+    detection = db.query(Detection).filter(Detection.id == detection_id).first()
+    if not detection:
+        raise HTTPException(status_code=404, detail="Detection not found")
+    
+    if detection.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    if detection.annotated_path and os.path.exists(detection.annotated_path):
+        return FileResponse(detection.annotated_path)
+    
+    if not detection.image_path or not os.path.exists(detection.image_path):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    # Rows created before boxes were stored already point at the annotated image
+    if detection.boxes_json is None:
+        return FileResponse(detection.image_path)
+    
+    annotated_path = annotated_path_for(detection.image_path, f"d{detection.id}")
     try:
-        cap = cv2.VideoCapture(file_location)
-        frame_count = 0
-        class_counts = {}
-        
-        # Process every 30th frame for efficiency
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            if frame_count % 30 == 0:  # Process every 30 frames
-                results = yolo_service.model(frame)
-                result = results[0]
-                
-                for box in result.boxes:
-                    cls_id = int(box.cls[0])
-                    label = yolo_service.class_names[cls_id]
-                    class_counts[label] = class_counts.get(label, 0) + 1
-        
-        cap.release()
-        
-        # Save original video path (for now, we don't generate annotated video)
-        output_video_path = file_location
-        
+        yolo_service.render_image(detection.image_path, detection.boxes_json, annotated_path)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Video processing failed: {str(e)}")
-    
-    # Save to DB
-    db_detection = Detection(
-        user_id=current_user.id,
-        video_path=output_video_path,
-        detection_type="video",
-        result_json=class_counts
-    )
-    db.add(db_detection)
-    db.commit()
-    db.refresh(db_detection)
+        raise HTTPException(status_code=500, detail=f"Rendering failed: {str(e)}")
     
-    return db_detection
+    detection.annotated_path = annotated_path
+    with stage_timer("db_commit"):
+        db.commit()
+    return FileResponse(annotated_path)
 
 @router.get("/video_feed")
-def video_feed():
-    return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+def video_feed(source: Optional[str] = None):
+    source = resolve_stream_source(source)
+    return StreamingResponse(generate_frames(source), media_type="multipart/x-mixed-replace; boundary=frame")
+
+@router.websocket("/ws")
+async def detection_stream(websocket: WebSocket, source: Optional[str] = None):
+    """Binary detection results per frame (see stream_protocol) plus low-rate raw JPEG keyframes"""
+    try:
+        source = resolve_stream_source(source)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await websocket.send_json({
+        "type": "hello",
+        "version": stream_protocol.VERSION,
+        "source": source,
+        "classes": yolo_service.class_names,
+        "keyframe_interval": settings.STREAM_KEYFRAME_INTERVAL,
+    })
+    subscription = stream_hub.subscribe(source, kind=WEBSOCKET)
+    try:
+        while True:
+            packet = await subscription.next()
+            if packet is None:
+                await websocket.close()
+                break
+            await websocket.send_bytes(packet.message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
+
+@router.get("/stream/stats")
+def get_stream_stats(current_user: User = Depends(get_current_admin_user)):
+    """Viewers and adaptive operating point of each live source"""
+    return stream_hub.stats()
 
 from fpdf import FPDF
-from fastapi.responses import FileResponse
 
 @router.get("/report/{detection_id}")
 def generate_report(
@@ -147,6 +321,12 @@ def generate_report(
     if detection.user_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    with stage_timer("pdf"):
+        output_path = write_report_pdf(detection)
+    
+    return FileResponse(output_path, filename=f"report_{detection.id}.pdf")
+
+def write_report_pdf(detection: Detection) -> str:
     pdf = FPDF()
     pdf.add_page()
     pdf.set_font("Arial", size=12)
@@ -165,6 +345,5 @@ def generate_report(
         
     output_path = f"uploads/report_{detection.id}.pdf"
     pdf.output(output_path)
-    
-    return FileResponse(output_path, filename=f"report_{detection.id}.pdf")
+    return output_path
 
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+from typing import Dict, List, Optional, Sequence, Tuple
 
+from backend.config import settings
 from backend.database import get_db
 from backend.models import User, Post, Comment, Like
 from backend.schemas import PostCreate, PostResponse, CommentCreate, CommentResponse
 from backend.dependencies import get_current_active_user
+from backend.services.pagination import keyset_page, NEXT_CURSOR_HEADER
 
 router = APIRouter(prefix="/forum", tags=["forum"])
 
@@ -30,27 +33,101 @@ def create_post(post: PostCreate, current_user: User = Depends(get_current_activ
         "created_at": new_post.created_at,
         "username": current_user.username,
         "comments": [],
+        "comments_count": 0,
         "likes_count": 0
     }
     return PostResponse(**response_data)
 
+def comment_response(comment: Comment, username: str) -> CommentResponse:
+    return CommentResponse(
+        id=comment.id,
+        content=comment.content,
+        user_id=comment.user_id,
+        created_at=comment.created_at,
+        username=username,
+    )
+
+def latest_comments(
+    db: Session, post_ids: Sequence[int], per_post: int
+) -> Tuple[Dict[int, List[CommentResponse]], Dict[int, int]]:
+    """
+    一次查询取出每个帖子最新的 per_post 条评论（含作者名）和评论总数
+
+    Returns:
+        ({post_id: [评论，按时间正序]}, {post_id: 评论总数})
+    """
+    ranked = (
+        select(
+            Comment.id.label("comment_id"),
+            func.row_number().over(
+                partition_by=Comment.post_id,
+                order_by=(Comment.created_at.desc(), Comment.id.desc()),
+            ).label("rank"),
+            func.count().over(partition_by=Comment.post_id).label("total"),
+        )
+        .where(Comment.post_id.in_(post_ids))
+        .subquery()
+    )
+    # per_post 为 0 时仍取每个帖子的第一条，只为带出评论总数
+    rows = (
+        db.query(Comment, User.username, ranked.c.rank, ranked.c.total)
+        .join(ranked, ranked.c.comment_id == Comment.id)
+        .join(User, User.id == Comment.user_id)
+        .filter(ranked.c.rank <= max(per_post, 1))
+        .order_by(Comment.post_id, ranked.c.rank.desc())
+        .all()
+    )
+    comments: Dict[int, List[CommentResponse]] = {}
+    totals: Dict[int, int] = {}
+    for comment, username, rank, total in rows:
+        totals[comment.post_id] = total
+        if rank <= per_post:
+            comments.setdefault(comment.post_id, []).append(comment_response(comment, username))
+    return comments, totals
+
+def like_counts(db: Session, post_ids: Sequence[int]) -> Dict[int, int]:
+    rows = (
+        db.query(Like.post_id, func.count(Like.id))
+        .filter(Like.post_id.in_(post_ids))
+        .group_by(Like.post_id)
+        .all()
+    )
+    return dict(rows)
+
 @router.get("/posts", response_model=List[PostResponse])
-def get_posts(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
-    posts = db.query(Post).order_by(Post.created_at.desc()).offset(skip).limit(limit).all()
+def get_posts(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
+    comments_limit: Optional[int] = Query(None, ge=0, le=50),
+    db: Session = Depends(get_db)
+):
+    """
+    帖子列表，固定 3 条查询，与每页帖子数无关：
+    帖子 + 作者（JOIN）、每个帖子最新的若干条评论 + 评论数（窗口函数）、点赞数（GROUP BY）
+
+    下一页的游标在 X-Next-Cursor 响应头中，作为 cursor 参数传入；skip 仍可使用
+    """
+    if comments_limit is None:
+        comments_limit = settings.FORUM_COMMENTS_PER_POST
+    try:
+        posts, next_cursor = keyset_page(
+            db.query(Post).options(joinedload(Post.author)),
+            Post.created_at, Post.id, limit, cursor=cursor, skip=skip,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not posts:
+        return []
+    post_ids = [post.id for post in posts]
+    comments, comment_totals = latest_comments(db, post_ids, comments_limit)
+    likes = like_counts(db, post_ids)
+
     results = []
     for post in posts:
-        # Build comments list
-        comments_list = []
-        for comment in post.comments:
-            comments_list.append({
-                "id": comment.id,
-                "content": comment.content,
-                "user_id": comment.user_id,
-                "created_at": comment.created_at,
-                "username": comment.author.username
-            })
-        
-        # Build response
         response_data = {
             "id": post.id,
             "title": post.title,
@@ -58,12 +135,34 @@ def get_posts(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
             "user_id": post.user_id,
             "created_at": post.created_at,
             "username": post.author.username,
-            "comments": comments_list,
-            "likes_count": len(post.likes)
+            "comments": comments.get(post.id, []),
+            "comments_count": comment_totals.get(post.id, 0),
+            "likes_count": likes.get(post.id, 0)
         }
         results.append(PostResponse(**response_data))
     return results
 
+@router.get("/posts/{post_id}/comments", response_model=List[CommentResponse])
+def get_comments(
+    post_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """一个帖子的评论，按时间正序分页"""
+    if db.query(Post.id).filter(Post.id == post_id).first() is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    rows = (
+        db.query(Comment, User.username)
+        .join(User, User.id == Comment.user_id)
+        .filter(Comment.post_id == post_id)
+        .order_by(Comment.created_at, Comment.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+    return [comment_response(comment, username) for comment, username in rows]
+
 @router.post("/posts/{post_id}/comments", response_model=CommentResponse)
 def create_comment(
     post_id: int, 
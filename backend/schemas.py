@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -61,13 +61,37 @@ class DetectionResponse(BaseModel):
     image_path: Optional[str]
     video_path: Optional[str]
     result_json: Optional[Dict[str, Any]]
+    boxes_json: Optional[List[Dict[str, Any]]] = None
+    annotated_path: Optional[str] = None
     detection_type: str
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class VideoJobResponse(BaseModel):
+    id: int
+    status: str
+    video_path: str
+    frames_total: int
+    frames_processed: int
+    progress: float # 0..1
+    eta_seconds: Optional[float] = None
+    result_json: Optional[Dict[str, Any]] = None
+    detection_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+
 # Forum Schemas
+class ModelLoadRequest(BaseModel):
+    weights_path: str
+    engine: Optional[str] = None  # 默认 INFERENCE_ENGINE
+    ab_percent: float = Field(0.0, ge=0, le=100)
+    promote: bool = False  # 预热完成后直接切换
+
+class ModelAbRequest(BaseModel):
+    percent: float = Field(..., ge=0, le=100)
+
 class CommentBase(BaseModel):
     content: str
 
@@ -94,7 +118,8 @@ class PostResponse(PostBase):
     id: int
     user_id: int
     created_at: datetime
-    comments: List[CommentResponse] = []
+    comments: List[CommentResponse] = []  # 最新的若干条评论，按时间正序
+    comments_count: int = 0
     likes_count: int
     username: str # Enriched field
 
@@ -0,0 +1,128 @@
+"""
+实时流自适应控制
+根据实测推理耗时调整实时流的工作点，让画面跟上摄像头：
+- 推理间隔（stride）：每 stride 帧推理一次，中间帧复用上一次的检测框
+- 推理尺寸（imgsz）：单次推理超过目标延迟时逐级降低输入尺寸，余量充足时再升回
+"""
+import math
+import threading
+import time
+from typing import Dict, List
+
+
+class AdaptiveController:
+    """
+    自适应帧跳过 / 分辨率控制器
+
+    Args:
+        target_latency_ms: 单帧（含推理）处理延迟目标
+        target_fps: 输出帧率目标，通常等于摄像头帧率
+        imgsz_ladder: 可选的推理尺寸，从大到小
+        max_stride: 最多每几帧推理一次
+        adjust_every: 每推理多少帧重新评估一次工作点
+        smoothing: 耗时指数滑动平均系数
+    """
+
+    def __init__(
+        self,
+        target_latency_ms: float,
+        target_fps: float,
+        imgsz_ladder: List[int],
+        max_stride: int = 5,
+        adjust_every: int = 10,
+        smoothing: float = 0.2,
+    ):
+        self.target_latency_ms = target_latency_ms
+        self.target_fps = target_fps
+        self.imgsz_ladder = sorted(set(imgsz_ladder), reverse=True)
+        self.max_stride = max(1, max_stride)
+        self.adjust_every = max(1, adjust_every)
+        self.smoothing = smoothing
+
+        self._level = 0  # imgsz_ladder 下标
+        self.stride = 1
+        self.infer_ms = None  # 推理帧的处理耗时（滑动平均）
+        self.reuse_ms = None  # 复用检测框的帧的处理耗时（滑动平均）
+        self.output_fps = 0.0
+
+        self.frames = 0
+        self.inferred_frames = 0
+        self._since_adjust = 0
+        self._last_frame_time = None
+        self._lock = threading.Lock()
+
+    @property
+    def imgsz(self) -> int:
+        return self.imgsz_ladder[self._level]
+
+    def should_infer(self) -> bool:
+        """当前帧是否需要推理（否则复用上一次的检测框）"""
+        return self.frames % self.stride == 0
+
+    def record(self, elapsed_ms: float, inferred: bool):
+        """记录一帧的处理耗时（采集之后到编码完成）"""
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_frame_time is not None:
+                fps = 1.0 / max(now - self._last_frame_time, 1e-6)
+                self.output_fps = self._ema(self.output_fps or fps, fps)
+            self._last_frame_time = now
+            self.frames += 1
+
+            if inferred:
+                self.inferred_frames += 1
+                self.infer_ms = self._ema(self.infer_ms, elapsed_ms)
+                self._since_adjust += 1
+                if self._since_adjust >= self.adjust_every:
+                    self._since_adjust = 0
+                    self._adjust()
+            else:
+                self.reuse_ms = self._ema(self.reuse_ms, elapsed_ms)
+
+    def _ema(self, current, value):
+        return value if current is None else (1 - self.smoothing) * current + self.smoothing * value
+
+    def _required_stride(self, infer_ms: float) -> int:
+        # 平均每帧耗时 (infer + (k-1) * reuse) / k 不超过帧间隔
+        budget = 1000.0 / self.target_fps
+        reuse = self.reuse_ms if self.reuse_ms is not None else 0.0
+        if infer_ms <= budget:
+            return 1
+        if budget <= reuse:
+            return self.max_stride + 1
+        return math.ceil((infer_ms - reuse) / (budget - reuse))
+
+    def _adjust(self):
+        infer_ms = self.infer_ms
+        lowest = len(self.imgsz_ladder) - 1
+
+        # 单帧延迟超标或跳帧也跟不上时降低推理尺寸
+        if self._level < lowest and (
+            infer_ms > self.target_latency_ms or self._required_stride(infer_ms) > self.max_stride
+        ):
+            self._level += 1
+            self.infer_ms = infer_ms * (self.imgsz_ladder[self._level] / self.imgsz_ladder[self._level - 1]) ** 2
+        # 余量充足时升回更大的尺寸（耗时近似与面积成正比）
+        elif self._level > 0:
+            scale = (self.imgsz_ladder[self._level - 1] / self.imgsz) ** 2
+            estimate = infer_ms * scale
+            if estimate < 0.8 * self.target_latency_ms and self._required_stride(estimate) <= self.stride:
+                self._level -= 1
+                self.infer_ms = estimate
+
+        self.stride = min(self._required_stride(self.infer_ms), self.max_stride)
+
+    def stats(self) -> Dict:
+        """当前工作点和实测耗时"""
+        with self._lock:
+            return {
+                "imgsz": self.imgsz,
+                "stride": self.stride,
+                "infer_ms": self.infer_ms,
+                "reuse_ms": self.reuse_ms,
+                "output_fps": self.output_fps,
+                "target_latency_ms": self.target_latency_ms,
+                "target_fps": self.target_fps,
+                "frames": self.frames,
+                "inferred_frames": self.inferred_frames,
+            }
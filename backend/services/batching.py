@@ -0,0 +1,199 @@
+"""
+推理微批处理调度器
+将并发到达的推理请求在一个很短的等待窗口内合并为一次批量前向计算，
+再把结果按顺序拆分返回给各个调用方
+"""
+import threading
+import queue
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatcherClosed(RuntimeError):
+    """批处理器已关闭，不再接受请求"""
+    pass
+
+
+class _BatchRequest:
+    """一次提交：若干输入 + 推理参数 + 等待结果的 Future"""
+
+    __slots__ = ("items", "params", "key", "future")
+
+    def __init__(self, items: List[Any], params: dict):
+        self.items = items
+        self.params = params
+        # 只有推理参数完全相同的请求才能合并到同一批（参数已由 MicroBatcher 补全默认值）
+        self.key = tuple(sorted(params.items()))
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """
+    动态微批处理器
+
+    所有推理都在单独的后台线程中串行执行，因此模型对象不会被多个线程同时调用。
+
+    Args:
+        batch_fn: 批量推理函数，签名为 batch_fn(items, **params) -> list，返回结果与输入一一对应
+        max_batch_size: 单次前向计算最多包含的样本数
+        max_wait_ms: 收到一批中的第一个请求后，最多等待多久以凑满一批（毫秒）
+        default_params: 推理参数的默认值，提交时先补全，省略参数和显式传入默认值的请求可以合并
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[..., List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        name: str = "yolo-batcher",
+        default_params: Optional[Dict[str, Any]] = None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.default_params = dict(default_params or {})
+
+        self._queue: "queue.Queue[_BatchRequest]" = queue.Queue()
+        self._carry: Deque[_BatchRequest] = deque()  # 参数不同或放不下、留到后续批次的请求（按到达顺序）
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # 统计信息
+        self.batches = 0
+        self.items_processed = 0
+
+    def submit(self, item: Any, **params) -> Any:
+        """提交单个输入并阻塞等待其结果"""
+        return self.submit_many([item], **params)[0]
+
+    def submit_many(self, items: List[Any], **params) -> List[Any]:
+        """提交一组输入（例如视频关键帧）并阻塞等待全部结果"""
+        if not items:
+            return []
+        return self.submit_async(items, **params).result()
+
+    def submit_async(self, items: List[Any], **params) -> Future:
+        """提交一组输入，返回一个 Future，结果为与输入等长的列表；关闭后抛出 BatcherClosed"""
+        request = _BatchRequest(list(items), {**self.default_params, **params})
+        with self._lock:
+            # 与 close() 互斥：请求要么排在结束标记之前被执行，要么被拒绝，不会在队列中无人处理
+            if self._closed:
+                raise BatcherClosed(f"{self.name} is closed")
+            self._start_locked()
+            self._queue.put(request)
+        return request.future
+
+    def close(self, wait: bool = False):
+        """
+        停止后台线程；已排队的请求先执行完，之后的提交抛出 BatcherClosed
+
+        Args:
+            wait: 是否等待后台线程退出（已排队的请求全部完成）
+        """
+        with self._lock:
+            if self._closed:
+                thread = None
+            else:
+                self._closed = True
+                thread = self._thread
+                if thread is not None:
+                    self._queue.put(None)
+        if wait and thread is not None:
+            thread.join()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def qsize(self) -> int:
+        """当前排队等待推理的请求数"""
+        return self._queue.qsize() + len(self._carry)
+
+    def _start_locked(self):
+        # 调用方持有 self._lock
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _next_request(self) -> Optional[_BatchRequest]:
+        if self._carry:
+            return self._carry.popleft()
+        return self._queue.get()
+
+    def _take_carried(self, batch: List[_BatchRequest], size: int) -> int:
+        """把之前留下的、与本批参数相同且放得下的请求并入本批，返回本批样本数"""
+        key = batch[0].key
+        kept: Deque[_BatchRequest] = deque()
+        while self._carry:
+            request = self._carry.popleft()
+            if request.key == key and size + len(request.items) <= self.max_batch_size:
+                batch.append(request)
+                size += len(request.items)
+            else:
+                kept.append(request)
+        self._carry = kept
+        return size
+
+    def _run(self):
+        while True:
+            first = self._next_request()
+            if first is None:
+                return
+            batch = [first]
+            size = self._take_carried(batch, len(first.items))
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    # close() 的结束标记，执行完当前批后退出
+                    self._queue.put(None)
+                    break
+                if request.key != first.key:
+                    # 参数不同，留到后续批次，继续为当前批收集请求
+                    self._carry.append(request)
+                    continue
+                if size + len(request.items) > self.max_batch_size:
+                    # 放不下，作为下一批的请求
+                    self._carry.append(request)
+                    break
+                batch.append(request)
+                size += len(request.items)
+
+            self._execute(batch)
+
+    def _execute(self, batch: List[_BatchRequest]):
+        items = [item for request in batch for item in request.items]
+        params = batch[0].params
+        try:
+            outputs = []
+            # 单个请求本身超过批大小时（如视频帧列表），按批大小切分执行
+            for start in range(0, len(items), self.max_batch_size):
+                outputs.extend(self.batch_fn(items[start:start + self.max_batch_size], **params))
+        except Exception as e:
+            logger.error(f"批量推理失败 ({len(items)} 张): {e}")
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items_processed += len(items)
+
+        offset = 0
+        for request in batch:
+            count = len(request.items)
+            request.future.set_result(outputs[offset:offset + count])
+            offset += count
@@ -0,0 +1,86 @@
+"""
+检测目标明细
+每个检测到的目标在 detection_objects 中占一行（类别、置信度、检测框），写入时在同一事务中累加统计计数
+（见 stats_counters）；核对计数时在这张表上用 GROUP BY 重新统计，不再逐条解析 result_json
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert
+
+from backend.models import Detection, DetectionObject
+from backend.services import stats_counters
+
+# 单条 INSERT 的最大行数
+INSERT_CHUNK = 1000
+
+
+def object_rows(
+    detection_id: int,
+    user_id: Optional[int],
+    detections: Optional[List[Dict]] = None,
+    class_counts: Optional[Dict[str, int]] = None,
+    created_at=None,
+) -> List[Dict]:
+    """
+    一次检测的明细行
+
+    Args:
+        detections: 逐框结果 [{"class", "confidence", "box"}]，图片检测
+        class_counts: 只有计数时（视频检测）按类别展开，置信度和检测框为空
+        created_at: 沿用检测记录的时间，为 None 时由数据库填当前时间
+    """
+    base = {"detection_id": detection_id, "user_id": user_id}
+    if created_at is not None:
+        base["created_at"] = created_at
+    rows = []
+    if detections is not None:
+        for det in detections:
+            x1, y1, x2, y2 = det["box"]
+            rows.append({
+                **base,
+                "class_name": det["class"],
+                "confidence": det["confidence"],
+                "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+            })
+    else:
+        for class_name, count in (class_counts or {}).items():
+            rows.extend({
+                **base,
+                "class_name": class_name,
+                "confidence": None,
+                "x1": None, "y1": None, "x2": None, "y2": None,
+            } for _ in range(int(count)))
+    return rows
+
+
+def insert_objects(conn, rows: Iterable[Dict]) -> int:
+    """批量写入明细行（executemany），conn 可以是 Session 或 Connection"""
+    rows = list(rows)
+    for i in range(0, len(rows), INSERT_CHUNK):
+        conn.execute(insert(DetectionObject.__table__), rows[i:i + INSERT_CHUNK])
+    return len(rows)
+
+
+def record_detection(
+    db,
+    detection: Detection,
+    detections: Optional[List[Dict]] = None,
+    class_counts: Optional[Dict[str, int]] = None,
+) -> int:
+    """在检测记录所在的事务中写入它的明细行并累加统计计数，调用方负责提交"""
+    if detection.id is None:
+        db.flush()
+    # created_at 由数据库填写，flush 后读回；明细行和按天计数都沿用这个值，与 reconcile 按 DATE(created_at) 统计的日期一致
+    created_at = detection.created_at
+    rows = object_rows(detection.id, detection.user_id, detections, class_counts, created_at=created_at)
+    confidences = {}
+    for row in rows:
+        if row["confidence"] is not None:
+            confidences.setdefault(row["class_name"], []).append(row["confidence"])
+    stats_counters.record_detection(
+        db, detection.user_id, Counter(row["class_name"] for row in rows),
+        day=created_at.date() if created_at is not None else None,
+        confidences=confidences,
+    )
+    return insert_objects(db, rows)
@@ -0,0 +1,256 @@
+"""
+推理引擎
+为 YoloService 提供可切换的推理后端：PyTorch (.pt)、ONNX Runtime、OpenVINO，以及两者的 INT8 量化模型。
+非 torch 引擎首次使用时从 .pt 权重自动导出，并缓存导出结果（INT8 模型需先用 test1.py quantize 生成）；
+所有后端都通过 ultralytics 的 YOLO 接口加载，返回的 Results 结构一致。
+
+也可以直接运行做一致性检查：
+    python -m backend.services.engines --engine onnx --source path/to/images
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.config import settings
+from backend.services.tracker import box_iou
+
+logger = logging.getLogger(__name__)
+
+
+def _yolo(path: str, **kwargs):
+    # ultralytics/torch 导入较慢，延迟到真正加载模型时再导入
+    from ultralytics import YOLO
+    return YOLO(path, **kwargs)
+
+
+class InferenceEngine:
+    """
+    推理引擎基类（PyTorch，直接加载 .pt 权重）
+
+    Args:
+        weights_path: .pt 权重路径
+        imgsz: 导出/推理使用的输入尺寸
+        cache_dir: 导出模型缓存目录，为空时使用权重所在目录
+    """
+
+    name = "torch"
+    export_format: Optional[str] = None
+    required_module: Optional[str] = None
+    # 导出图是否支持动态 batch（决定能否使用微批处理）
+    supports_batching = True
+    # 是否支持运行时改变输入尺寸（实时流自适应降低 imgsz）
+    dynamic_imgsz = True
+
+    def __init__(self, weights_path: str, imgsz: int = 640, cache_dir: str = ""):
+        self.weights_path = Path(weights_path)
+        self.imgsz = imgsz
+        self.cache_dir = Path(cache_dir) if cache_dir else self.weights_path.parent
+
+    @classmethod
+    def available(cls) -> bool:
+        """运行时依赖是否已安装"""
+        return cls.required_module is None or importlib.util.find_spec(cls.required_module) is not None
+
+    def artifact_path(self) -> Path:
+        return self.weights_path
+
+    def ensure_artifact(self) -> Path:
+        return self.weights_path
+
+    def load(self):
+        return _yolo(str(self.ensure_artifact()), task="detect")
+
+
+class ExportedEngine(InferenceEngine):
+    """需要从 .pt 导出的引擎，导出结果按权重文件和 imgsz 缓存"""
+
+    artifact_suffix = ""
+    export_kwargs: Dict = {}
+
+    def artifact_path(self) -> Path:
+        return self.cache_dir / f"{self.weights_path.stem}_{self.imgsz}{self.artifact_suffix}"
+
+    def ensure_artifact(self) -> Path:
+        target = self.artifact_path()
+        # 权重比导出结果新时重新导出
+        if target.exists() and target.stat().st_mtime >= self.weights_path.stat().st_mtime:
+            return target
+
+        logger.info(f"导出 {self.name} 模型: {self.weights_path} -> {target}")
+        exported = Path(_yolo(str(self.weights_path)).export(
+            format=self.export_format, imgsz=self.imgsz, **self.export_kwargs
+        ))
+        if exported.resolve() != target.resolve():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            if target.is_dir():
+                shutil.rmtree(target)
+            elif target.exists():
+                target.unlink()
+            shutil.move(str(exported), str(target))
+        return target
+
+
+class OnnxEngine(ExportedEngine):
+    name = "onnx"
+    export_format = "onnx"
+    required_module = "onnxruntime"
+    artifact_suffix = ".onnx"
+    export_kwargs = {"dynamic": True, "simplify": True}
+
+
+class OpenVinoEngine(ExportedEngine):
+    name = "openvino"
+    export_format = "openvino"
+    required_module = "openvino"
+    # 目录名需包含 "_openvino_model"，ultralytics 据此识别后端
+    artifact_suffix = "_openvino_model"
+    # 导出为静态形状，只能以导出尺寸逐张推理
+    supports_batching = False
+    dynamic_imgsz = False
+
+
+class QuantizedEngine(ExportedEngine):
+    """
+    INT8 量化模型。量化需要校准数据，不在服务启动时自动生成：
+    先运行 `python test1.py quantize --weights <best.pt> --data <data.yaml>`，
+    产物按 artifact_path() 的命名放在权重目录（或 ENGINE_CACHE_DIR）下
+    """
+
+    def ensure_artifact(self) -> Path:
+        target = self.artifact_path()
+        if not target.exists():
+            raise FileNotFoundError(
+                f"Quantized model not found: {target}. "
+                f"Run `python test1.py quantize --weights {self.weights_path} --data <data.yaml>` first"
+            )
+        if target.stat().st_mtime < self.weights_path.stat().st_mtime:
+            logger.warning(f"量化模型早于权重文件，建议重新量化: {target}")
+        return target
+
+
+class OnnxInt8Engine(QuantizedEngine):
+    name = "onnx_int8"
+    required_module = "onnxruntime"
+    artifact_suffix = "_int8.onnx"
+
+
+class OpenVinoInt8Engine(QuantizedEngine):
+    name = "openvino_int8"
+    required_module = "openvino"
+    artifact_suffix = "_int8_openvino_model"
+    supports_batching = False
+    dynamic_imgsz = False
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (InferenceEngine, OnnxEngine, OpenVinoEngine, OnnxInt8Engine, OpenVinoInt8Engine)
+}
+
+
+def get_engine(name: str, weights_path: str, imgsz: int = 640, cache_dir: str = "") -> InferenceEngine:
+    """
+    根据名称创建推理引擎，依赖未安装时回退到 torch
+
+    Raises:
+        ValueError: 未知的引擎名称
+    """
+    engine_cls = ENGINES.get(name.lower())
+    if engine_cls is None:
+        raise ValueError(f"Unknown inference engine '{name}', expected one of {sorted(ENGINES)}")
+    if not engine_cls.available():
+        logger.warning(f"推理引擎 {name} 需要安装 {engine_cls.required_module}，回退到 torch")
+        engine_cls = InferenceEngine
+    return engine_cls(weights_path, imgsz=imgsz, cache_dir=cache_dir)
+
+
+def result_arrays(result):
+    """(类别编号, 置信度, xyxy 框) 三个数组"""
+    boxes = result.boxes
+    return (
+        boxes.cls.cpu().numpy().astype(int),
+        boxes.conf.cpu().numpy(),
+        boxes.xyxy.cpu().numpy(),
+    )
+
+
+def check_parity(
+    weights_path: str,
+    engine_name: str,
+    sources: List[str],
+    imgsz: int = 640,
+    cache_dir: str = "",
+    iou_threshold: float = 0.9,
+    conf_tolerance: float = 0.05,
+) -> Dict:
+    """
+    对比 torch 与指定引擎在同一批图片上的检测结果
+
+    同类别且 IoU >= iou_threshold 的框视为匹配，置信度差不超过 conf_tolerance 视为一致。
+
+    Returns:
+        dict: 匹配数、漏检数、多检数、最大置信度差以及是否通过
+    """
+    reference = InferenceEngine(weights_path, imgsz=imgsz).load()
+    candidate = get_engine(engine_name, weights_path, imgsz=imgsz, cache_dir=cache_dir).load()
+
+    report = {"engine": engine_name, "images": 0, "matched": 0, "missing": 0, "extra": 0, "max_conf_diff": 0.0}
+    for source in sources:
+        ref_cls, ref_conf, ref_xyxy = result_arrays(reference(source, imgsz=imgsz, verbose=False)[0])
+        cand_cls, cand_conf, cand_xyxy = result_arrays(candidate(source, imgsz=imgsz, verbose=False)[0])
+        report["images"] += 1
+
+        matched = 0
+        if len(ref_cls) and len(cand_cls):
+            iou = box_iou(ref_xyxy, cand_xyxy)
+            iou[ref_cls[:, None] != cand_cls[None, :]] = 0.0
+            # 贪心匹配：每次取剩余 IoU 最大的一对
+            while True:
+                i, j = np.unravel_index(np.argmax(iou), iou.shape)
+                if iou[i, j] < iou_threshold:
+                    break
+                report["max_conf_diff"] = max(report["max_conf_diff"], float(abs(ref_conf[i] - cand_conf[j])))
+                iou[i, :] = 0.0
+                iou[:, j] = 0.0
+                matched += 1
+
+        report["matched"] += matched
+        report["missing"] += len(ref_cls) - matched
+        report["extra"] += len(cand_cls) - matched
+
+    report["passed"] = (
+        report["missing"] == 0 and report["extra"] == 0 and report["max_conf_diff"] <= conf_tolerance
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check detection parity between torch and an exported engine")
+    parser.add_argument("--engine", default=settings.INFERENCE_ENGINE, choices=sorted(ENGINES))
+    parser.add_argument("--weights", default=settings.MODEL_PATH)
+    parser.add_argument("--source", required=True, help="image file or directory")
+    parser.add_argument("--imgsz", type=int, default=settings.INFERENCE_IMGSZ)
+    parser.add_argument("--iou", type=float, default=0.9)
+    parser.add_argument("--conf-tol", type=float, default=0.05)
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    exts = {".jpg", ".jpeg", ".png", ".bmp"}
+    sources = sorted(str(p) for p in source.iterdir() if p.suffix.lower() in exts) if source.is_dir() else [str(source)]
+
+    report = check_parity(
+        args.weights, args.engine, sources, imgsz=args.imgsz, cache_dir=settings.ENGINE_CACHE_DIR,
+        iou_threshold=args.iou, conf_tolerance=args.conf_tol,
+    )
+    print(json.dumps(report, indent=2))
+    raise SystemExit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
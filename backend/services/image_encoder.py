@@ -0,0 +1,217 @@
+"""
+JPEG 编码
+实时流、关键帧、标注图片共用的编码入口：
+- 安装了 PyTurboJPEG 时使用 libjpeg-turbo 直接编码，否则使用 OpenCV
+- 每个线程复用一块预分配的输出缓冲区，避免每帧重新分配
+- 质量和色度抽样按用途分别配置（profile），实时流可按目标帧大小自适应调整质量
+"""
+import inspect
+import logging
+import threading
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+SUBSAMPLINGS = ("444", "422", "420", "gray")
+
+
+class JpegProfile:
+    """一种用途的编码参数"""
+
+    __slots__ = ("quality", "subsampling")
+
+    def __init__(self, quality: int, subsampling: str = "420"):
+        if subsampling not in SUBSAMPLINGS:
+            raise ValueError(f"Unknown chroma subsampling: {subsampling}")
+        self.quality = max(1, min(100, int(quality)))
+        self.subsampling = subsampling
+
+
+class OpenCvBackend:
+    """cv2.imencode；编码结果直接以 memoryview 返回，省去 tobytes() 的拷贝"""
+
+    name = "opencv"
+
+    def __init__(self):
+        self._sampling = {
+            key: getattr(cv2, f"IMWRITE_JPEG_SAMPLING_FACTOR_{key}", None)
+            for key in ("444", "422", "420")
+        }
+
+    def encode(self, image: np.ndarray, profile: JpegProfile):
+        params = [cv2.IMWRITE_JPEG_QUALITY, profile.quality]
+        if profile.subsampling == "gray":
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        elif self._sampling.get(profile.subsampling) is not None:
+            params += [cv2.IMWRITE_JPEG_SAMPLING_FACTOR, self._sampling[profile.subsampling]]
+        ok, buffer = cv2.imencode(".jpg", image, params)
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return buffer.reshape(-1).data
+
+
+class TurboJpegBackend:
+    """
+    libjpeg-turbo（PyTurboJPEG）；支持 dst 参数的版本把实时流大小的画面编码进每个线程复用的缓冲区，
+    更大的图片（保存的标注图）每次单独分配，避免线程池中每个线程常驻一个按最大图片分配的缓冲区
+    """
+
+    name = "turbojpeg"
+    # 复用缓冲区的最大像素数（1280x720，缓冲区约 5.5 MB）
+    REUSE_MAX_PIXELS = 1280 * 720
+
+    def __init__(self):
+        import turbojpeg
+
+        self._jpeg = turbojpeg.TurboJPEG()
+        self._subsample = {
+            "444": turbojpeg.TJSAMP_444,
+            "422": turbojpeg.TJSAMP_422,
+            "420": turbojpeg.TJSAMP_420,
+            "gray": turbojpeg.TJSAMP_GRAY,
+        }
+        self._pixel_format = {3: turbojpeg.TJPF_BGR, 1: turbojpeg.TJPF_GRAY}
+        self._supports_dst = "dst" in inspect.signature(self._jpeg.encode).parameters
+        self._local = threading.local()
+
+    def _buffer(self, image: np.ndarray) -> Optional[bytearray]:
+        """当前线程的复用缓冲区，图片超过 REUSE_MAX_PIXELS 时返回 None"""
+        height, width = image.shape[:2]
+        if height * width > self.REUSE_MAX_PIXELS:
+            return None
+        # 最坏情况下的输出大小（与 tjBufSize 相同的上界：按 16 像素对齐、每像素 6 字节）
+        size = ((width + 15) & ~15) * ((height + 15) & ~15) * 6 + 2048
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < size:
+            buffer = self._local.buffer = bytearray(size)
+        return buffer
+
+    def encode(self, image: np.ndarray, profile: JpegProfile):
+        channels = 1 if image.ndim == 2 else image.shape[2]
+        kwargs = {
+            "quality": profile.quality,
+            "pixel_format": self._pixel_format[channels],
+            "jpeg_subsample": self._subsample["gray" if channels == 1 else profile.subsampling],
+        }
+        image = np.ascontiguousarray(image)
+        buffer = self._buffer(image) if self._supports_dst else None
+        if buffer is None:
+            # 由 libjpeg-turbo 分配，返回按实际大小的 bytes
+            return self._jpeg.encode(image, **kwargs)
+        buffer, size = self._jpeg.encode(image, dst=buffer, **kwargs)
+        # 缓冲区会被下一帧覆盖，结果需要独立的一份（只拷贝压缩后的数据）
+        return bytes(memoryview(buffer)[:size])
+
+
+BACKENDS = {
+    OpenCvBackend.name: OpenCvBackend,
+    TurboJpegBackend.name: TurboJpegBackend,
+}
+
+
+def create_backend(name: str = "auto"):
+    """按名称创建编码后端；auto 优先 turbojpeg，不可用时回退到 OpenCV"""
+    if name == "auto":
+        try:
+            return TurboJpegBackend()
+        except Exception:
+            return OpenCvBackend()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown JPEG encoder: {name}. Choose from {', '.join(BACKENDS)}")
+    try:
+        return BACKENDS[name]()
+    except Exception as e:
+        logger.warning(f"JPEG 编码后端 {name} 不可用 ({e})，回退到 opencv")
+        return OpenCvBackend()
+
+
+class AdaptiveQuality:
+    """
+    按目标帧大小调整编码质量：连续超出目标时降低质量，明显低于目标时升回，不超过 profile 的质量
+
+    Args:
+        profile: 基础编码参数
+        target_bytes: 单帧目标大小
+        min_quality: 最低质量
+        step: 每次调整的质量步长
+    """
+
+    def __init__(self, profile: JpegProfile, target_bytes: int, min_quality: int = 40, step: int = 5):
+        self.max_quality = profile.quality
+        self.profile = JpegProfile(profile.quality, profile.subsampling)
+        self.target_bytes = target_bytes
+        self.min_quality = min(min_quality, profile.quality)
+        self.step = step
+
+    @property
+    def quality(self) -> int:
+        return self.profile.quality
+
+    def update(self, size: int):
+        """记录一帧的编码大小，调整下一帧的质量"""
+        if size > 1.1 * self.target_bytes and self.profile.quality > self.min_quality:
+            self.profile.quality = max(self.min_quality, self.profile.quality - self.step)
+        elif size < 0.8 * self.target_bytes and self.profile.quality < self.max_quality:
+            self.profile.quality = min(self.max_quality, self.profile.quality + self.step)
+
+
+class JpegEncoder:
+    """
+    按用途编码 JPEG
+
+    Args:
+        backend: 编码后端名称（auto / turbojpeg / opencv）
+        profiles: 用途名 -> JpegProfile
+    """
+
+    def __init__(self, backend: str = "auto", profiles: Optional[Dict[str, JpegProfile]] = None):
+        self.backend = create_backend(backend)
+        self.profiles = dict(profiles or {})
+        self.frames = 0
+        self.bytes_out = 0
+
+    def encode(self, image: np.ndarray, profile="stream"):
+        """
+        编码一张 BGR 图片
+
+        Args:
+            image: BGR（或灰度）图片
+            profile: 用途名或 JpegProfile
+
+        Returns:
+            JPEG 数据（bytes 或 memoryview，均可直接写文件、拼接或发送）
+        """
+        if not isinstance(profile, JpegProfile):
+            profile = self.profiles[profile]
+        data = self.backend.encode(image, profile)
+        self.frames += 1
+        self.bytes_out += len(data)
+        return data
+
+    def stats(self) -> Dict:
+        return {
+            "backend": self.backend.name,
+            "frames": self.frames,
+            "bytes_out": self.bytes_out,
+            "profiles": {
+                name: {"quality": p.quality, "subsampling": p.subsampling}
+                for name, p in self.profiles.items()
+            },
+        }
+
+
+def default_profiles() -> Dict[str, JpegProfile]:
+    """各用途的编码参数（来自配置）"""
+    return {
+        "stream": JpegProfile(settings.JPEG_STREAM_QUALITY, settings.JPEG_STREAM_SUBSAMPLING),
+        "keyframe": JpegProfile(settings.STREAM_KEYFRAME_QUALITY, settings.JPEG_KEYFRAME_SUBSAMPLING),
+        "annotated": JpegProfile(settings.JPEG_ANNOTATED_QUALITY, settings.JPEG_ANNOTATED_SUBSAMPLING),
+    }
+
+
+jpeg_encoder = JpegEncoder(backend=settings.JPEG_ENCODER, profiles=default_profiles())
@@ -0,0 +1,79 @@
+"""
+推理执行器
+把阻塞的推理调用放到有界线程池中执行，async 路由通过 await 等待结果，
+事件循环在推理期间仍可处理其他请求；排队过多时拒绝新任务（背压）
+"""
+import asyncio
+import functools
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """推理队列已满"""
+    pass
+
+
+class InferenceExecutor:
+    """
+    有界推理线程池
+
+    PyTorch / ONNX Runtime 在计算时会释放 GIL，多个线程可以同时占用多个核心；
+    模型本身由 MicroBatcher 串行调用，因此线程池里的任务会被合并成批量推理。
+
+    Args:
+        max_workers: 线程数（同时执行的任务数）
+        max_queue: 除正在执行的任务外，最多允许排队的任务数
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32):
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = self.max_workers + max(0, int(max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """正在执行和排队中的任务总数"""
+        return self._pending
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在线程池中执行 fn(*args, **kwargs) 并等待结果
+
+        Raises:
+            InferenceQueueFull: 任务数已达上限
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise InferenceQueueFull(f"inference queue is full ({self._pending} pending)")
+            self._pending += 1
+
+        try:
+            future = self._pool.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release()
+            raise
+        # 以任务真正结束为准释放名额，客户端断开导致的取消不会提前放行新任务
+        future.add_done_callback(lambda _: self._release())
+        return await asyncio.wrap_future(future)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_QUEUE_SIZE,
+)
@@ -0,0 +1,215 @@
+"""
+运行指标
+进程内的计数器、直方图、仪表，按 Prometheus 文本格式（0.0.4）输出到 /metrics。
+不依赖 prometheus_client；多进程部署时每个 worker 各自输出
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 各处理阶段耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple, float]]:
+        """(名称后缀, 标签名, 标签值, 数值) 列表"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", self.label_names, key, value) for key, value in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：各桶计数（不累计）+ 溢出桶、总和
+        self._values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 块的耗时（秒），异常时同样记录"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(c), t[0])) for key, (c, t) in self._values.items())
+        names = self.label_names + ("le",)
+        out = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append(("_bucket", names, key + (_format_value(bound),), cumulative))
+            out.append(("_sum", self.label_names, key, total))
+            out.append(("_count", self.label_names, key, cumulative))
+        return out
+
+
+class Gauge(_Metric):
+    """
+    仪表：set() 设置数值，或用 callback 在每次采集时读取当前值
+
+    callback 返回数值（无标签）或 {标签值元组: 数值}
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labels=(), callback: Optional[Callable] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.callback is not None:
+            current = self.callback()
+            if not isinstance(current, dict):
+                current = {(): current}
+            items = sorted(
+                (tuple(str(v) for v in (key if isinstance(key, tuple) else (key,))), value)
+                for key, value in current.items()
+            )
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [("", self.label_names, key, value) for key, value in items]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()) -> Counter:
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, labels=(), callback=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def render(self) -> str:
+        """Prometheus 文本格式；采集失败的仪表跳过，不影响其它指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        parts = []
+        for metric in metrics:
+            try:
+                parts.append(metric.render())
+            except Exception:
+                continue
+        return "\n".join(parts) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "pest_stage_seconds",
+    "Time spent in each processing stage",
+    ["stage"],
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "pest_http_request_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+DETECTIONS_TOTAL = registry.counter(
+    "pest_detections_total",
+    "Detected pests by class",
+    ["class_name", "source"],
+)
+
+
+def stage_timer(stage: str):
+    """
+    统计一个处理阶段的耗时，阶段名：
+    upload_save, decode, inference, plot, image_write, db_commit, pdf
+    """
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def count_detections(class_counts: Dict[str, int], source: str):
+    """按类别累计检测数（source: image / video）"""
+    for class_name, count in (class_counts or {}).items():
+        DETECTIONS_TOTAL.inc(count, class_name=class_name, source=source)
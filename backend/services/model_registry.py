@@ -0,0 +1,384 @@
+"""
+模型注册表
+支持不停机切换权重：新权重在后台加载、预热后原子地切换流量，已在处理中的请求在旧模型上执行完，
+旧模型空闲后再释放。可选按百分比把部分流量路由到候选模型做 A/B 对比，并按模型统计推理延迟
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.config import settings
+from backend.services.batching import MicroBatcher
+from backend.services.engines import get_engine
+from backend.services.metrics import stage_timer
+from backend.services.result_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """推理延迟统计：累计次数 / 均值 + 最近 window 次的分位数"""
+
+    def __init__(self, window: int = 1000):
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms: float):
+        with self._lock:
+            self._recent.append(elapsed_ms)
+            self.count += 1
+            self.total_ms += elapsed_ms
+
+    def stats(self) -> Dict:
+        with self._lock:
+            recent = np.array(self._recent, dtype=np.float64)
+            count, total = self.count, self.total_ms
+        if not count:
+            return {"count": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99])
+        return {
+            "count": count,
+            "mean_ms": total / count,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+        }
+
+
+class ModelHandle:
+    """
+    一份权重：推理引擎、模型对象、独立的微批处理器和延迟统计
+
+    Args:
+        weights_path: .pt 权重路径（非 torch 引擎从它导出）
+        engine_name: torch / onnx / openvino
+        name: 展示用名称，默认取 runs/<name>/weights/best.pt 中的 <name>
+    """
+
+    def __init__(self, weights_path: str, engine_name: str = "torch", name: Optional[str] = None):
+        self.weights_path = weights_path
+        self.name = name or default_model_name(weights_path)
+        # torch / onnx / openvino, exported graphs are cached next to the weights
+        self.engine = get_engine(
+            engine_name,
+            weights_path,
+            imgsz=settings.INFERENCE_IMGSZ,
+            cache_dir=settings.ENGINE_CACHE_DIR,
+        )
+        # Loaded lazily by load() or on first inference
+        self.model = None
+        self.model_version = None
+        self.state = "cold"  # cold -> loading -> warming -> ready / failed, retiring -> retired
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._load_lock = threading.Lock()
+        # Concurrent callers are grouped into one batched forward pass
+        self.batcher = MicroBatcher(
+            self._infer_batch,
+            max_batch_size=settings.BATCH_MAX_SIZE if self.engine.supports_batching else 1,
+            max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+            name=f"yolo-batcher-{self.name}",
+            default_params={"imgsz": settings.INFERENCE_IMGSZ, "conf": settings.INFERENCE_CONF},
+        )
+        self.latency = LatencyStats()
+        # 正在使用该模型的请求数，降为 0 后旧模型才能释放
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    def load(self):
+        """Load the weights for the configured engine (exporting them first if needed).
+
+        Returns False if another caller already loaded the model.
+        """
+        with self._load_lock:
+            if self.model is not None:
+                return False
+            if self.state in ("retiring", "retired"):
+                # 候选模型在加载完成前被放弃
+                raise RuntimeError(f"Model {self.name} has been retired")
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                self.model = self.engine.load()
+                # Weights fingerprint, part of the result cache key
+                self.model_version = file_digest(self.weights_path)
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                logger.error(f"模型加载失败 ({self.name}): {e}")
+                raise
+            self.load_seconds = time.perf_counter() - start
+            self.state = "warming"
+            logger.info(f"模型已加载 ({self.name}, {self.engine.name}, {self.load_seconds:.2f}s)")
+            return True
+
+    def ensure_loaded(self):
+        if self.model is None and self.load():
+            # Loaded on demand, without warmup
+            self.state = "ready"
+
+    def warmup(self, runs, imgsz=None):
+        """Run a few dummy inferences at the serving imgsz so kernels / graphs are initialised"""
+        imgsz = imgsz or settings.INFERENCE_IMGSZ
+        self.ensure_loaded()
+        self.state = "warming"
+        start = time.perf_counter()
+        dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+        try:
+            for _ in range(runs):
+                self.batcher.submit(dummy, imgsz=imgsz)
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.error(f"模型预热失败 ({self.name}): {e}")
+            raise
+        self.warmup_seconds = time.perf_counter() - start
+        self.state = "ready"
+        logger.info(f"模型预热完成 ({self.name}, {runs} 次, {self.warmup_seconds:.2f}s)")
+
+    def _infer_batch(self, sources, **params):
+        if self.state == "retired":
+            # 已释放的模型不再重新加载
+            raise RuntimeError(f"Model {self.name} has been retired")
+        self.ensure_loaded()
+        with stage_timer("inference"):
+            return self.model(sources, **params)
+
+    def infer(self, source, **params):
+        """One image / frame through this model's batcher, returns one Result"""
+        return self.infer_many([source], **params)[0]
+
+    def infer_many(self, sources, **params):
+        """A list of images / frames through this model's batcher, Results in the same order"""
+        start = time.perf_counter()
+        results = self.batcher.submit_many(list(sources), **params)
+        self.latency.record((time.perf_counter() - start) * 1000)
+        return results
+
+    def acquire(self):
+        with self._idle:
+            self._inflight += 1
+
+    def release(self):
+        with self._idle:
+            self._inflight -= 1
+            if self._inflight <= 0:
+                self._idle.notify_all()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def retire(self, timeout: Optional[float] = None):
+        """
+        等待处理中的请求全部结束后停止批处理线程并释放模型
+
+        仍在使用该模型的请求（例如整段视频）不会被中断；每等待 timeout 秒仍未结束时记录一次警告
+        """
+        self.state = "retiring"
+        timeout = timeout or None
+        with self._idle:
+            while not self._idle.wait_for(lambda: self._inflight <= 0, timeout=timeout):
+                logger.warning(f"模型 {self.name} 仍有 {self._inflight} 个请求未结束，继续等待")
+        # 已排队的批次先执行完，之后的提交抛出 BatcherClosed
+        self.batcher.close(wait=True)
+        self.state = "retired"
+        self.model = None
+        logger.info(f"模型已释放 ({self.name})")
+
+    def status(self) -> Dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "engine": self.engine.name,
+            "model_path": self.weights_path,
+            "model_version": self.model_version,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+            "inflight": self._inflight,
+            "queued": self.batcher.qsize(),
+            "latency": self.latency.stats(),
+        }
+
+
+def default_model_name(weights_path: str) -> str:
+    """runs/<name>/weights/best.pt -> <name>，其余取文件名"""
+    path = Path(weights_path)
+    if path.parent.name == "weights" and path.parent.parent.name:
+        return f"{path.parent.parent.name}/{path.stem}"
+    return path.stem
+
+
+def model_dirs() -> List[Path]:
+    """允许通过注册表加载权重的目录"""
+    return [Path(d.strip()).resolve() for d in settings.MODEL_DIRS.split(",") if d.strip()]
+
+
+def resolve_weights_path(weights_path: str) -> str:
+    """检查权重文件存在且位于 MODEL_DIRS 之下（.pt 反序列化可执行代码，不接受任意路径）"""
+    path = Path(weights_path).resolve()
+    if path.suffix != ".pt" or not path.is_file():
+        raise ValueError(f"Weights file not found: {weights_path}")
+    if not any(path == root or root in path.parents for root in model_dirs()):
+        raise ValueError(f"Weights must be under one of: {settings.MODEL_DIRS}")
+    return str(path)
+
+
+def available_weights() -> List[str]:
+    """MODEL_DIRS 下所有 weights/*.pt"""
+    found = []
+    for root in model_dirs():
+        if root.is_dir():
+            found.extend(str(p) for p in sorted(root.glob("**/weights/*.pt")))
+    return found
+
+
+class ModelRegistry:
+    """
+    当前服务的模型（active）和可选的候选模型（candidate）
+
+    - load(): 后台加载并预热新权重，promote=True 时预热完成后立即切换，否则作为候选模型
+    - ab_percent: 候选模型就绪后接收的流量百分比
+    - promote(): 候选模型原子地成为 active，旧模型在处理中的请求结束后释放
+    """
+
+    def __init__(self, active: ModelHandle):
+        self.active = active
+        self.candidate: Optional[ModelHandle] = None
+        self.ab_percent = 0.0
+        self.swaps = 0
+        self._lock = threading.Lock()
+
+    def handles(self) -> List[ModelHandle]:
+        with self._lock:
+            return [h for h in (self.active, self.candidate) if h is not None]
+
+    def route(self) -> ModelHandle:
+        """为一个请求选择模型"""
+        candidate = self.candidate
+        if (
+            candidate is not None
+            and candidate.state == "ready"
+            and self.ab_percent > 0
+            and random.random() * 100 < self.ab_percent
+        ):
+            return candidate
+        return self.active
+
+    @contextmanager
+    def acquire(self, handle: Optional[ModelHandle] = None):
+        """
+        在一个请求期间占用模型，保证切换后请求仍在同一个模型上完成
+
+        Args:
+            handle: 调用方已选定的模型（嵌套调用时传入），为 None 时按 route() 选择
+        """
+        with self._lock:
+            handle = handle or self.route()
+            handle.acquire()
+        try:
+            yield handle
+        finally:
+            handle.release()
+
+    def load(
+        self,
+        weights_path: str,
+        engine_name: Optional[str] = None,
+        ab_percent: float = 0.0,
+        promote: bool = False,
+    ) -> ModelHandle:
+        """在后台线程中加载、预热新权重，立即返回新模型（state 从 cold 开始变化）"""
+        handle = ModelHandle(weights_path, engine_name or settings.INFERENCE_ENGINE)
+        with self._lock:
+            if self.candidate is not None and self.candidate.state in ("cold", "loading", "warming"):
+                raise RuntimeError(f"Model {self.candidate.name} is still loading")
+            previous, self.candidate = self.candidate, handle
+            self.ab_percent = 0.0
+        if previous is not None:
+            self._retire_later(previous)
+
+        def run():
+            try:
+                handle.load()
+                handle.warmup(settings.MODEL_WARMUP_RUNS)
+            except Exception:
+                return  # state / error are reported by stats()
+            with self._lock:
+                dropped = self.candidate is not handle
+                if not dropped and not promote:
+                    self.ab_percent = max(0.0, min(100.0, float(ab_percent)))
+            if dropped:
+                # 加载期间已不再是候选模型，释放刚加载的模型
+                self._retire_later(handle)
+                return
+            if promote:
+                try:
+                    self.promote(handle)
+                except RuntimeError as e:
+                    logger.error(f"模型 {handle.name} 切换失败: {e}")
+
+        threading.Thread(target=run, name=f"model-load-{handle.name}", daemon=True).start()
+        return handle
+
+    def promote(self, handle: Optional[ModelHandle] = None) -> ModelHandle:
+        """候选模型成为 active；新请求立即走新模型，旧模型在后台等待处理中的请求结束"""
+        with self._lock:
+            handle = handle or self.candidate
+            if handle is None or handle is not self.candidate:
+                raise RuntimeError("No candidate model to promote")
+            if handle.state != "ready":
+                raise RuntimeError(f"Candidate model is {handle.state}, not ready")
+            previous, self.active = self.active, handle
+            self.candidate = None
+            self.ab_percent = 0.0
+            self.swaps += 1
+        logger.info(f"模型已切换: {previous.name} -> {handle.name}")
+        self._retire_later(previous)
+        return handle
+
+    def drop_candidate(self) -> bool:
+        """放弃候选模型（A/B 结束或新权重有问题）；候选模型仍在加载时抛出 RuntimeError"""
+        with self._lock:
+            if self.candidate is not None and self.candidate.state in ("cold", "loading", "warming"):
+                raise RuntimeError(f"Model {self.candidate.name} is still loading")
+            candidate, self.candidate = self.candidate, None
+            self.ab_percent = 0.0
+        if candidate is None:
+            return False
+        self._retire_later(candidate)
+        return True
+
+    def set_ab_percent(self, percent: float):
+        if self.candidate is None:
+            raise RuntimeError("No candidate model")
+        self.ab_percent = max(0.0, min(100.0, float(percent)))
+
+    def _retire_later(self, handle: ModelHandle):
+        threading.Thread(
+            target=handle.retire,
+            kwargs={"timeout": settings.MODEL_RETIRE_TIMEOUT},
+            name=f"model-retire-{handle.name}",
+            daemon=True,
+        ).start()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            active, candidate = self.active, self.candidate
+        return {
+            "active": active.status(),
+            "candidate": candidate.status() if candidate else None,
+            "ab_percent": self.ab_percent,
+            "swaps": self.swaps,
+        }
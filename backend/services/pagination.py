@@ -0,0 +1,92 @@
+"""
+游标（keyset）分页
+列表按 (created_at, id) 倒序，游标记录上一页最后一行的这两个值，下一页用
+created_at <= t AND (created_at < t OR id < i) 直接从索引中定位，深翻页不再扫描、丢弃前面的行。
+游标对客户端是不透明的字符串，内容和编码方式可以随时调整。
+SQLite 把时间存成文本，server_default 写入 'YYYY-MM-DD HH:MM:SS'，绑定参数却是 '... .ffffff'，
+直接比较字符串会把游标所在的行再取一次；因此 SQLite 上排序和比较都先转成同一种格式（见 sort_time）
+"""
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, literal, or_
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+# 下一页游标的响应头，响应体仍是列表以兼容旧客户端
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class sort_time(FunctionElement):
+    """排序和游标比较使用的时间值：SQLite 上统一为 'YYYY-MM-DD HH:MM:SS.SSS'，其他数据库就是原值（可走索引）"""
+    inherit_cache = True
+
+
+@compiles(sort_time)
+def _compile_sort_time(element, compiler, **kw):
+    return compiler.process(element.clauses, **kw)
+
+
+@compiles(sort_time, "sqlite")
+def _compile_sort_time_sqlite(element, compiler, **kw):
+    return f"strftime('%Y-%m-%d %H:%M:%f', {compiler.process(element.clauses, **kw)})"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    payload = json.dumps({"t": created_at.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式不对时抛 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_query(query, created_col, id_col, limit: int, cursor: Optional[str] = None, skip: int = 0):
+    """
+    给 Query / select() 加上排序、游标条件和 LIMIT（多取一行，用于判断是否还有下一页）
+
+    Args:
+        cursor: 上一页返回的游标，给出时忽略 skip
+        skip: 兼容旧的 OFFSET 分页
+    """
+    created_key = sort_time(created_col)
+    query = query.order_by(created_key.desc(), id_col.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # 参数按列的类型绑定，与列值经过同样的转换后再比较
+        created_at = sort_time(literal(created_at, created_col.type))
+        query = query.filter(
+            created_key <= created_at,
+            or_(created_key < created_at, and_(created_key == created_at, id_col < row_id)),
+        )
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+
+def split_page(rows: List, created_col, id_col, limit: int):
+    """keyset_query 的结果 -> (本页行, 下一页游标)，没有下一页时游标为 None"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+
+
+def keyset_page(query, created_col, id_col, limit: int, cursor: Optional[str] = None, skip: int = 0):
+    """
+    同步 Session 的 Query 按 (created_col, id_col) 倒序取一页
+
+    Returns:
+        (本页行, 下一页游标)
+    """
+    rows = keyset_query(query, created_col, id_col, limit, cursor=cursor, skip=skip).all()
+    return split_page(rows, created_col, id_col, limit)
@@ -0,0 +1,53 @@
+"""
+检测框绘制
+不依赖 ultralytics 的 Results 对象，直接根据检测结果（类别、置信度、xyxy 框）在图片上画框，
+用于按需渲染标注图
+"""
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+# 与 ultralytics 默认调色板前 12 种颜色一致（BGR）
+PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255),
+    (49, 210, 207), (10, 249, 72), (23, 204, 146), (134, 219, 61),
+    (52, 147, 26), (187, 212, 0), (168, 153, 44), (255, 194, 0),
+]
+
+
+def class_color(cls_id: int):
+    return PALETTE[cls_id % len(PALETTE)]
+
+
+def draw_detections(image: np.ndarray, detections: List[Dict], class_names: List[str]) -> np.ndarray:
+    """
+    在图片上原地绘制检测框和标签
+
+    Args:
+        image: BGR 图片
+        detections: [{"class": 类别名, "confidence": 置信度, "box": [x1, y1, x2, y2]}, ...]
+        class_names: 类别名列表，用于确定颜色
+
+    Returns:
+        绘制后的图片（与输入是同一个数组）
+    """
+    lw = max(round(sum(image.shape[:2]) / 2 * 0.003), 2)
+    tf = max(lw - 1, 1)
+    font_scale = lw / 3
+    for det in detections:
+        x1, y1, x2, y2 = (int(v) for v in det["box"])
+        label = det["class"]
+        color = class_color(class_names.index(label) if label in class_names else 0)
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, lw, cv2.LINE_AA)
+
+        text = f"{label} {det['confidence']:.2f}"
+        w, h = cv2.getTextSize(text, 0, fontScale=font_scale, thickness=tf)[0]
+        outside = y1 - h >= 3
+        y_text = y1 - h - 3 if outside else y1 + h + 3
+        cv2.rectangle(image, (x1, y1), (x1 + w, y_text), color, -1, cv2.LINE_AA)
+        cv2.putText(
+            image, text, (x1, y1 - 2 if outside else y1 + h + 2),
+            0, font_scale, (255, 255, 255), tf, cv2.LINE_AA,
+        )
+    return image
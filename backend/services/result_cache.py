@@ -0,0 +1,157 @@
+"""
+检测结果缓存
+以 图片内容哈希 + 模型权重指纹 + 推理参数 为键缓存 predict_image 的结果，
+重复上传同一张图片时直接返回缓存的检测框和标注图路径，不再调用模型。
+两级缓存：按字节数淘汰的内存 LRU + 可选的磁盘目录（服务重启后仍然有效）
+"""
+import hashlib
+import json
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """计算文件（如模型权重）的 sha256，用作模型指纹"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_cache_key(data: bytes, model_version: str, params: Dict) -> str:
+    """
+    生成缓存键
+
+    Args:
+        data: 上传图片的原始字节
+        model_version: 模型权重指纹
+        params: 影响结果的推理参数（imgsz、引擎等）
+    """
+    h = hashlib.sha256(data)
+    h.update(model_version.encode("utf-8"))
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    两级检测结果缓存，缓存值须可 JSON 序列化
+
+    Args:
+        max_bytes: 内存层容量（按 JSON 序列化后的字节数计算），<=0 时关闭缓存
+        disk_dir: 磁盘层目录，为空则不使用磁盘层
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str = ""):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.enabled and disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[0])
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        # 磁盘命中后提升到内存层
+        self._put_memory(key, json.dumps(value))
+        return value
+
+    def put(self, key: str, value: Dict):
+        if not self.enabled:
+            return
+        payload = json.dumps(value)
+        self._put_memory(key, payload)
+        self._write_disk(key, payload)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _put_memory(self, key: str, payload: str):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (payload, size)
+            self._bytes += size
+            # 超出容量时淘汰最久未使用的条目
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        path = self._disk_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取结果缓存失败 {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, payload: str):
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+            # 原子替换，避免并发读到写了一半的文件
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入结果缓存失败 {path}: {e}")
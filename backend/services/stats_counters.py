@@ -0,0 +1,393 @@
+"""
+统计计数器
+后台首页的总用户数、检测数、各类害虫数、按天趋势和按用户统计保存在 stat_counters / stat_daily 两张汇总表中，
+注册用户、保存检测记录时在同一事务里累加，/admin/stats 只读汇总表，耗时与数据量无关。
+计数在并发或异常路径（手工改库、回滚后重试）下可能有少量偏差，reconcile() 按实际数据修正；
+只应在一个进程中定期执行：cron 调用 python -m backend.services.stats_counters，或单进程部署时开启 STATS_RECONCILER。
+按天计数一律以数据库时钟为准：记在检测记录 created_at 的日期上（与 reconcile 的 DATE(created_at) 相同），
+"今天"也取数据库的 CURRENT_DATE，应用服务器与数据库时区不同时不会在零点前后把检测记到相邻的一天
+"""
+import argparse
+import logging
+import math
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+
+from backend.models import Detection, DetectionObject, StatCounter, StatDaily, User
+
+logger = logging.getLogger(__name__)
+
+USERS = "users"
+DETECTIONS = "detections"
+OBJECTS = "objects"  # key: 类别
+USER_TOTAL = "user_total"  # key: 用户 ID
+USER_OBJECTS = "user_objects"  # key: "用户 ID:类别"
+# 平均置信度 = 置信度之和 / 有置信度的目标数（视频检测的目标没有置信度）；计数为整数，和按 CONFIDENCE_SCALE 放大后取整
+CONFIDENCE_SUM = "confidence_sum"  # key: 类别
+CONFIDENCE_COUNT = "confidence_count"  # key: 类别
+CONFIDENCE_SCALE = 10000
+
+
+def scaled_confidence(confidence: float) -> int:
+    """与 reconcile 中 SQL 的 ROUND(confidence * CONFIDENCE_SCALE) 相同的取整（四舍五入）"""
+    return int(math.floor(confidence * CONFIDENCE_SCALE + 0.5))
+
+
+def _dialect(conn) -> str:
+    """Session 或 Connection 对应的数据库方言"""
+    bind = conn.get_bind() if hasattr(conn, "get_bind") else conn
+    return bind.dialect.name
+
+
+def _upsert_add(conn, table, rows):
+    """按主键累加 value，行不存在时插入"""
+    if not rows:
+        return
+    dialect = _dialect(conn)
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        stmt = stmt.on_duplicate_key_update(value=table.c["value"] + stmt.inserted["value"])
+    elif dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[c for c in table.primary_key.columns],
+            set_={"value": table.c["value"] + stmt.excluded["value"]},
+        )
+    else:
+        # 其他数据库：逐行先 UPDATE，未命中再 INSERT
+        key_columns = [c for c in table.primary_key.columns]
+        for row in rows:
+            result = conn.execute(
+                table.update()
+                .where(and_(*[c == row[c.name] for c in key_columns]))
+                .values(value=table.c["value"] + row["value"])
+            )
+            if not result.rowcount:
+                conn.execute(table.insert(), [row])
+        return
+    conn.execute(stmt, rows)
+
+
+def increment(
+    conn,
+    counters: Dict[Tuple[str, str], int],
+    daily: Optional[Dict[Tuple[str, str], int]] = None,
+    day: Optional[date] = None,
+):
+    """
+    在调用方的事务中累加计数，随该事务一起提交或回滚
+
+    Args:
+        counters: {(name, key): 增量}
+        daily: {(name, key): 增量}，记在 day（默认数据库的今天）
+    """
+    # 按主键顺序加锁，避免并发事务互相死锁
+    _upsert_add(conn, StatCounter.__table__, [
+        {"name": name, "key": key, "value": value}
+        for (name, key), value in sorted(counters.items()) if value
+    ])
+    if daily:
+        day = day or db_today(conn)
+        _upsert_add(conn, StatDaily.__table__, [
+            {"day": day, "name": name, "key": key, "value": value}
+            for (name, key), value in sorted(daily.items()) if value
+        ])
+
+
+def record_user(conn):
+    increment(conn, {(USERS, ""): 1})
+
+
+def record_detection(
+    conn,
+    user_id: Optional[int],
+    class_counts: Dict[str, int],
+    day: Optional[date] = None,
+    confidences: Optional[Dict[str, List[float]]] = None,
+):
+    """
+    一条检测记录及其各类别目标数
+
+    Args:
+        day: 检测记录 created_at 的日期
+        confidences: {类别: [各目标的置信度]}，只有计数的视频检测为 None
+    """
+    counters = {(DETECTIONS, ""): 1}
+    daily = {(DETECTIONS, ""): 1}
+    for class_name, count in class_counts.items():
+        counters[(OBJECTS, class_name)] = count
+        daily[(OBJECTS, class_name)] = count
+        if user_id is not None:
+            counters[(USER_OBJECTS, f"{user_id}:{class_name}")] = count
+    if user_id is not None:
+        counters[(USER_TOTAL, str(user_id))] = sum(class_counts.values())
+    for class_name, values in (confidences or {}).items():
+        counters[(CONFIDENCE_SUM, class_name)] = sum(scaled_confidence(v) for v in values)
+        counters[(CONFIDENCE_COUNT, class_name)] = len(values)
+    increment(conn, counters, daily, day=day)
+
+
+def _as_date(value) -> date:
+    # MySQL 的 DATE() 返回 date，SQLite 返回字符串
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def db_today(conn) -> date:
+    """数据库时钟的当前日期，与 server_default 的 now() 同一时区"""
+    return _as_date(conn.execute(select(func.current_date())).scalar())
+
+
+def _actual_counts(conn) -> Tuple[Dict[Tuple, int], Dict[Tuple, int]]:
+    """按 users / detections / detection_objects 计算应有的计数：({(name, key): 值}, {(day, name, key): 值})"""
+    objects = DetectionObject.__table__
+    detections = Detection.__table__
+    counters = {
+        (USERS, ""): conn.execute(select(func.count()).select_from(User.__table__)).scalar(),
+        (DETECTIONS, ""): conn.execute(select(func.count()).select_from(detections)).scalar(),
+    }
+    for class_name, count in conn.execute(
+        select(objects.c.class_name, func.count()).group_by(objects.c.class_name)
+    ):
+        counters[(OBJECTS, class_name)] = count
+    for user_id, class_name, count in conn.execute(
+        select(objects.c.user_id, objects.c.class_name, func.count())
+        .where(objects.c.user_id.isnot(None))
+        .group_by(objects.c.user_id, objects.c.class_name)
+    ):
+        counters[(USER_OBJECTS, f"{user_id}:{class_name}")] = count
+        counters[(USER_TOTAL, str(user_id))] = counters.get((USER_TOTAL, str(user_id)), 0) + count
+    # MySQL 的 FLOAT 列是单精度，个别边界值取整后可能与写入时差 1，以这里的结果为准
+    for class_name, total, count in conn.execute(
+        select(objects.c.class_name, func.sum(func.round(objects.c.confidence * CONFIDENCE_SCALE)),
+               func.count(objects.c.confidence))
+        .where(objects.c.confidence.isnot(None))
+        .group_by(objects.c.class_name)
+    ):
+        counters[(CONFIDENCE_SUM, class_name)] = int(total)
+        counters[(CONFIDENCE_COUNT, class_name)] = count
+
+    daily = {}
+    detection_day = func.date(detections.c.created_at)
+    for day, count in conn.execute(
+        select(detection_day, func.count())
+        .where(detections.c.created_at.isnot(None))
+        .group_by(detection_day)
+    ):
+        daily[(_as_date(day), DETECTIONS, "")] = count
+    object_day = func.date(objects.c.created_at)
+    for day, class_name, count in conn.execute(
+        select(object_day, objects.c.class_name, func.count())
+        .where(objects.c.created_at.isnot(None))
+        .group_by(object_day, objects.c.class_name)
+    ):
+        daily[(_as_date(day), OBJECTS, class_name)] = count
+    return counters, daily
+
+
+def _stored_counts(conn, table) -> Dict[Tuple, int]:
+    key_columns = [c for c in table.primary_key.columns]
+    return {
+        tuple(_as_date(v) if c.name == "day" else v for c, v in zip(key_columns, row[:-1])): row[-1]
+        for row in conn.execute(select(*key_columns, table.c["value"]))
+    }
+
+
+def _correct(conn, table, actual: Dict[Tuple, int], stored: Dict[Tuple, int]) -> int:
+    """
+    逐行把有偏差的计数改为绝对值，返回修改的行数
+
+    actual 与 stored 来自同一快照；写入前对该行加锁并重新读取，
+    快照之后其他事务累加的增量（当前值 - stored）保留在新值中
+    """
+    key_columns = [c for c in table.primary_key.columns]
+    changed = 0
+    # 按主键顺序加锁，与 increment() 一致，避免死锁
+    for key in sorted(set(actual) | set(stored)):
+        drift = actual.get(key, 0) - stored.get(key, 0)
+        if not drift:
+            continue
+        where = and_(*[c == v for c, v in zip(key_columns, key)])
+        current = conn.execute(select(table.c["value"]).where(where).with_for_update()).scalar()
+        if current is None:
+            # 快照之后被删除或从未写入，插入应有的值（0 不必保存）
+            if actual.get(key, 0):
+                conn.execute(table.insert(), [
+                    {**{c.name: v for c, v in zip(key_columns, key)}, "value": actual[key]}
+                ])
+                changed += 1
+            continue
+        conn.execute(table.update().where(where).values(value=current + drift))
+        changed += 1
+    return changed
+
+
+def reconcile(conn) -> Dict[str, int]:
+    """
+    按实际数据修正计数（全表扫描，只在后台定期执行）
+
+    只改有偏差的行，不删表、不锁其余计数行，期间注册 / 检测的累加不会丢失。
+    conn 应处于可重复读的事务中，使统计查询和读取的计数来自同一快照（MySQL 默认即是）
+
+    Returns:
+        {"counters": 修正的行数, "daily": 修正的行数}
+    """
+    counters, daily = _actual_counts(conn)
+    stored_counters = _stored_counts(conn, StatCounter.__table__)
+    stored_daily = _stored_counts(conn, StatDaily.__table__)
+    return {
+        "counters": _correct(conn, StatCounter.__table__, counters, stored_counters),
+        "daily": _correct(conn, StatDaily.__table__, daily, stored_daily),
+    }
+
+
+def snapshot(db, days: int = 30, top_users: int = 10) -> Dict:
+    """/admin/stats 的数据，只读汇总表"""
+    totals: Dict[Tuple[str, str], int] = {
+        (name, key): value
+        for name, key, value in db.query(StatCounter.name, StatCounter.key, StatCounter.value)
+        .filter(StatCounter.name.in_((USERS, DETECTIONS, OBJECTS, CONFIDENCE_SUM, CONFIDENCE_COUNT)))
+    }
+
+    def avg_confidence(class_name: str) -> Optional[float]:
+        count = totals.get((CONFIDENCE_COUNT, class_name), 0)
+        return totals.get((CONFIDENCE_SUM, class_name), 0) / CONFIDENCE_SCALE / count if count else None
+
+    pests = sorted(
+        ({"class": key, "count": value, "avg_confidence": avg_confidence(key)}
+         for (name, key), value in totals.items() if name == OBJECTS and value),
+        key=lambda p: -p["count"],
+    )
+
+    today = db_today(db)
+    since = today - timedelta(days=days - 1)
+    daily = {}
+    today_detections = 0
+    for day, name, key, value in (
+        db.query(StatDaily.day, StatDaily.name, StatDaily.key, StatDaily.value)
+        .filter(StatDaily.day >= since)
+        .order_by(StatDaily.day)
+    ):
+        entry = daily.setdefault(day, {"date": day.isoformat(), "total": 0, "detections": 0, "by_class": {}})
+        if name == DETECTIONS:
+            entry["detections"] = value
+            if day == today:
+                today_detections = value
+        elif name == OBJECTS and value:
+            entry["total"] += value
+            entry["by_class"][key] = value
+
+    users = []
+    if top_users:
+        top = (
+            db.query(StatCounter.key, StatCounter.value)
+            .filter(StatCounter.name == USER_TOTAL, StatCounter.value > 0)
+            .order_by(StatCounter.value.desc())
+            .limit(top_users)
+            .all()
+        )
+        if top:
+            user_ids = [int(key) for key, _ in top]
+            names = dict(db.query(User.id, User.username).filter(User.id.in_(user_ids)))
+            by_user = {
+                int(key): {"user_id": int(key), "username": names.get(int(key)), "total": value, "by_class": {}}
+                for key, value in top
+            }
+            for key, value in db.query(StatCounter.key, StatCounter.value).filter(
+                StatCounter.name == USER_OBJECTS,
+                or_(*[StatCounter.key.startswith(f"{user_id}:") for user_id in user_ids]),
+            ):
+                user_id, class_name = key.split(":", 1)
+                if value:
+                    by_user[int(user_id)]["by_class"][class_name] = value
+            users = list(by_user.values())
+
+    return {
+        "total_users": totals.get((USERS, ""), 0),
+        "total_detections": totals.get((DETECTIONS, ""), 0),
+        "today_detections": today_detections,
+        "total_pests": sum(p["count"] for p in pests),
+        "pests": pests,
+        "daily": list(daily.values()),
+        "users": users,
+    }
+
+
+def run_reconcile(engine) -> Dict[str, int]:
+    """在一个可重复读事务中执行 reconcile()"""
+    with engine.connect() as conn:
+        if conn.dialect.name in ("mysql", "postgresql"):
+            conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            return reconcile(conn)
+
+
+class StatsReconciler:
+    """
+    后台线程：启动时核对一次，之后每 interval 秒核对一次。
+    多个 worker 各自启动会重复扫描全表，只应在一个进程中运行（见 STATS_RECONCILER）
+
+    Args:
+        engine: SQLAlchemy Engine
+        interval: 核对间隔（秒），0 表示只在启动时核对
+    """
+
+    def __init__(self, engine, interval: float = 3600.0):
+        self.engine = engine
+        self.interval = max(0.0, float(interval))
+        self.last_result = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        self.last_result = run_reconcile(self.engine)
+        logger.info(f"统计计数已核对: {self.last_result}")
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"统计计数核对失败: {e}")
+            if not self.interval or self._stopping.wait(self.interval):
+                return
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="stats-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    from backend.database import engine
+
+    parser = argparse.ArgumentParser(description="Reconcile stat_counters / stat_daily with the actual data")
+    parser.add_argument("--interval", type=float, default=0.0,
+                        help="keep running and reconcile every N seconds (default: once, for cron)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    reconciler = StatsReconciler(engine, interval=args.interval)
+    if not args.interval:
+        reconciler.run_once()
+        print(reconciler.last_result)
+        return
+    reconciler.start()
+    try:
+        reconciler._thread.join()
+    except KeyboardInterrupt:
+        reconciler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+实时视频流分发
+每个视频源只有一个生产者线程：采集、推理、JPEG 编码每帧只做一次，结果放入共享环形缓冲区；
+任意数量的订阅者从缓冲区读取最新帧。读得慢的订阅者直接跳到最新帧（丢帧），不会拖慢生产者。
+订阅者分两种：MJPEG（画好检测框的 JPEG）和 WebSocket（二进制检测结果 + 低频原始关键帧），
+生产者只为当前有订阅者的那种输出做编码
+"""
+import asyncio
+import threading
+import time
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+
+import cv2
+
+from backend.config import settings
+from backend.services.adaptive import AdaptiveController
+from backend.services.image_encoder import AdaptiveQuality, jpeg_encoder
+from backend.services.rendering import draw_detections
+from backend.services.stream_protocol import pack_frame
+from backend.services.yolo_service import yolo_service
+
+logger = logging.getLogger(__name__)
+
+
+MJPEG = "mjpeg"
+WEBSOCKET = "ws"
+
+
+class FramePacket:
+    """
+    生产者输出的一帧
+
+    jpeg: 画好检测框的 JPEG（bytes 或 memoryview），没有 MJPEG 订阅者时为 None
+    message: 二进制检测消息（见 stream_protocol），没有 WebSocket 订阅者时为 None
+    """
+
+    __slots__ = ("seq", "timestamp", "jpeg", "message")
+
+    def __init__(self, seq: int, timestamp: float, jpeg, message: Optional[bytes]):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+        self.message = message
+
+
+def parse_source(source: str):
+    """摄像头编号写成数字（"0"），其余按文件路径 / URL 交给 OpenCV"""
+    return int(source) if source.isdigit() else source
+
+
+def make_controller(camera) -> AdaptiveController:
+    """按配置和摄像头帧率创建自适应控制器；导出尺寸固定的引擎只使用 INFERENCE_IMGSZ"""
+    target_fps = settings.STREAM_TARGET_FPS or camera.get(cv2.CAP_PROP_FPS) or 30.0
+    ladder = [settings.INFERENCE_IMGSZ]
+    if yolo_service.engine.dynamic_imgsz:
+        ladder = [int(size) for size in settings.STREAM_IMGSZ_LADDER.split(",") if size.strip()] or ladder
+    return AdaptiveController(
+        target_latency_ms=settings.STREAM_TARGET_LATENCY_MS,
+        target_fps=target_fps,
+        imgsz_ladder=ladder,
+        max_stride=settings.STREAM_MAX_STRIDE,
+    )
+
+
+class StreamProducer:
+    """
+    单个视频源的生产者
+
+    Args:
+        source: 摄像头编号或视频流地址
+        ring_size: 环形缓冲区保留的帧数
+        previous: 同一视频源上一个仍在退出的生产者，先等它释放设备再打开
+        on_exit: 线程退出（设备已释放）后的回调
+    """
+
+    def __init__(
+        self,
+        source: str,
+        ring_size: int = 4,
+        previous: Optional["StreamProducer"] = None,
+        on_exit: Optional[Callable[["StreamProducer"], None]] = None,
+    ):
+        self.source = source
+        self._previous = previous
+        self._on_exit = on_exit
+        self._ring: Deque[FramePacket] = deque(maxlen=max(1, ring_size))
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._seq = 0
+        self._running = threading.Event()
+        self._state_lock = threading.Lock()
+        self._exiting = False  # 线程已决定退出，之后不能再 revive()
+        self._thread: Optional[threading.Thread] = None
+        self.closed = False
+        self.frames_produced = 0
+        self.keyframes = 0
+        self.keyframe_requested = False  # 新的 WebSocket 订阅者需要尽快拿到关键帧
+        self.quality: Optional[AdaptiveQuality] = None
+        self.controller: Optional[AdaptiveController] = None
+        # 各类订阅者数，由 StreamHub 在持锁时维护
+        self.viewer_kinds: Dict[str, int] = {MJPEG: 0, WEBSOCKET: 0}
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.source}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """通知线程停止；线程在当前帧处理完后释放设备并退出"""
+        self._running.clear()
+
+    def revive(self) -> bool:
+        """撤销 stop()：线程还没有开始退出时继续运行，返回是否成功"""
+        with self._state_lock:
+            if self._exiting or self.closed:
+                return False
+            self._running.set()
+            return True
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def alive(self) -> bool:
+        return self._running.is_set() and not self.closed
+
+    def _keep_running(self) -> bool:
+        with self._state_lock:
+            if self._running.is_set():
+                return True
+            self._exiting = True
+            return False
+
+    def _run(self):
+        if self._previous is not None:
+            # 同一个摄像头不能同时打开两次，等上一个生产者释放设备
+            self._previous.join()
+            self._previous = None
+        camera = cv2.VideoCapture(parse_source(self.source))
+        if not camera.isOpened():
+            logger.error(f"无法打开视频源: {self.source}")
+        # 只保留最新一帧，避免推理慢时读到积压的旧画面
+        camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.controller = make_controller(camera)
+        detections = None
+        last_keyframe = None
+        quality = None
+        if settings.JPEG_STREAM_TARGET_KB > 0:
+            quality = AdaptiveQuality(
+                jpeg_encoder.profiles["stream"], target_bytes=int(settings.JPEG_STREAM_TARGET_KB * 1024)
+            )
+        self.quality = quality
+        try:
+            while self._keep_running():
+                success, frame = camera.read()
+                if not success:
+                    break
+
+                started = time.perf_counter()
+                inferred = detections is None or self.controller.should_infer()
+                if inferred:
+                    # YOLO Inference
+                    detections = yolo_service.predict_frame(frame, imgsz=self.controller.imgsz)
+
+                message = None
+                if self.viewer_kinds[WEBSOCKET]:
+                    # 关键帧是原始画面，必须在绘制检测框之前编码
+                    keyframe = None
+                    interval = settings.STREAM_KEYFRAME_INTERVAL
+                    due = last_keyframe is None or started - last_keyframe >= interval
+                    if interval > 0 and (due or self.keyframe_requested):
+                        self.keyframe_requested = False
+                        keyframe = jpeg_encoder.encode(frame, "keyframe")
+                        last_keyframe = started
+                        self.keyframes += 1
+                    height, width = frame.shape[:2]
+                    message = pack_frame(self._seq, time.time(), width, height, *detections, keyframe=keyframe)
+
+                jpeg = None
+                if self.viewer_kinds[MJPEG]:
+                    annotated_frame = draw_detections(
+                        frame, yolo_service.detection_dicts(*detections), yolo_service.class_names
+                    )
+                    jpeg = jpeg_encoder.encode(annotated_frame, quality.profile if quality else "stream")
+                    if quality:
+                        quality.update(len(jpeg))
+
+                if jpeg is not None or message is not None:
+                    self._publish(jpeg, message)
+                self.controller.record((time.perf_counter() - started) * 1000, inferred)
+        except Exception as e:
+            logger.error(f"视频源 {self.source} 处理失败: {e}")
+        finally:
+            with self._state_lock:
+                self._exiting = True
+            camera.release()
+            self.closed = True
+            self._notify()
+            if self._on_exit is not None:
+                self._on_exit(self)
+
+    def _publish(self, jpeg, message: Optional[bytes]):
+        with self._lock:
+            self._ring.append(FramePacket(self._seq, time.time(), jpeg, message))
+            self._seq += 1
+        self.frames_produced += 1
+        self._notify()
+
+    def _notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    def next_packet(self, last_seq: int) -> Optional[FramePacket]:
+        """返回最新帧；订阅者已读过最新帧时返回 None。中间来不及读的帧直接跳过"""
+        with self._lock:
+            if not self._ring or self._ring[-1].seq <= last_seq:
+                return None
+            return self._ring[-1]
+
+    def add_waiter(self, waiter):
+        with self._lock:
+            self._waiters.add(waiter)
+
+    def remove_waiter(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+
+class Subscription:
+    """一个订阅者，在事件循环中等待生产者的新帧"""
+
+    def __init__(self, hub: "StreamHub", producer: StreamProducer, kind: str):
+        self._hub = hub
+        self.producer = producer
+        self.kind = kind
+        self._event = asyncio.Event()
+        self._waiter = (asyncio.get_running_loop(), self._event)
+        self._last_seq = -1
+        self._closed = False
+        self.dropped = 0
+        producer.add_waiter(self._waiter)
+
+    async def next(self) -> Optional[FramePacket]:
+        """等待下一帧，视频源结束时返回 None"""
+        while True:
+            packet = self.producer.next_packet(self._last_seq)
+            if packet is not None:
+                if self._last_seq >= 0:
+                    self.dropped += packet.seq - self._last_seq - 1
+                self._last_seq = packet.seq
+                # 订阅刚建立时生产者可能还没开始为这种订阅者编码
+                if (packet.jpeg if self.kind == MJPEG else packet.message) is not None:
+                    return packet
+                continue
+            if self.producer.closed:
+                return None
+            self._event.clear()
+            # 清除事件后再检查一次，避免错过刚发布的帧
+            if self.producer.next_packet(self._last_seq) is None and not self.producer.closed:
+                await self._event.wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.producer.remove_waiter(self._waiter)
+        self._hub.release(self.producer, self.kind)
+
+
+class StreamHub:
+    """
+    视频源注册表：第一个订阅者到来时启动生产者，最后一个订阅者离开时停止。
+    停止中的生产者留在注册表中直到线程退出，期间有新订阅者时继续使用它，不会重复打开同一个设备
+
+    Args:
+        ring_size: 每个生产者环形缓冲区的帧数
+    """
+
+    def __init__(self, ring_size: int = 4):
+        self.ring_size = ring_size
+        self._producers: Dict[str, StreamProducer] = {}
+        self._viewers: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, source: str, kind: str = MJPEG) -> Subscription:
+        """订阅视频源（必须在事件循环中调用），kind 为 MJPEG 或 WEBSOCKET"""
+        with self._lock:
+            producer = self._producers.get(source)
+            if producer is None or (not producer.alive and not producer.revive()):
+                # 旧的生产者已在退出时，新线程先等它释放设备
+                producer = StreamProducer(
+                    source, ring_size=self.ring_size, previous=producer, on_exit=self._discard
+                )
+                self._producers[source] = producer
+                self._viewers[source] = 0
+                producer.start()
+            self._viewers[source] += 1
+            producer.viewer_kinds[kind] += 1
+            if kind == WEBSOCKET:
+                producer.keyframe_requested = True
+        return Subscription(self, producer, kind)
+
+    def release(self, producer: StreamProducer, kind: str = MJPEG):
+        with self._lock:
+            if self._producers.get(producer.source) is not producer:
+                return
+            producer.viewer_kinds[kind] -= 1
+            self._viewers[producer.source] -= 1
+            if self._viewers[producer.source] <= 0:
+                producer.stop()
+                # 线程退出后由 _discard 移出注册表；已经退出的直接移除
+                if producer.closed:
+                    del self._producers[producer.source]
+                    del self._viewers[producer.source]
+
+    def _discard(self, producer: StreamProducer):
+        """生产者线程退出后，没有订阅者时移出注册表"""
+        with self._lock:
+            if self._producers.get(producer.source) is producer and self._viewers.get(producer.source, 0) <= 0:
+                del self._producers[producer.source]
+                del self._viewers[producer.source]
+
+    def viewers(self) -> Dict[str, int]:
+        """各视频源当前的订阅者数"""
+        with self._lock:
+            return dict(self._viewers)
+
+    def stats(self) -> Dict[str, Dict]:
+        """各视频源的订阅者数、已产出帧数和自适应控制器的当前工作点"""
+        with self._lock:
+            producers = list(self._producers.items())
+            viewers = dict(self._viewers)
+        return {
+            source: {
+                "viewers": viewers.get(source, 0),
+                "viewer_kinds": dict(producer.viewer_kinds),
+                "frames_produced": producer.frames_produced,
+                "keyframes": producer.keyframes,
+                "jpeg_quality": producer.quality.quality if producer.quality else None,
+                "adaptive": producer.controller.stats() if producer.controller else None,
+            }
+            for source, producer in producers
+        }
+
+    def stop_all(self):
+        with self._lock:
+            for producer in self._producers.values():
+                producer.stop()
+            self._producers.clear()
+            self._viewers.clear()
+
+
+stream_hub = StreamHub(ring_size=settings.STREAM_RING_SIZE)
@@ -0,0 +1,79 @@
+"""
+实时检测流的二进制消息格式（WebSocket）
+每帧一条消息，小端序：
+
+    偏移  类型          字段
+    0     char[2]       魔数 b"PD"
+    2     uint8         协议版本
+    3     uint8         标志位，bit0 = 消息末尾带 JPEG 关键帧
+    4     uint32        帧序号
+    8     float64       时间戳（Unix 秒）
+    16    uint16        画面宽度
+    18    uint16        画面高度
+    20    uint32        检测框数 N
+    24    float32[N*4]  xyxy 框（像素）
+    ...   float32[N]    置信度
+    ...   uint8[N]      类别编号
+    ...   bytes         JPEG 关键帧（原始画面，不含检测框），直到消息末尾
+
+头部 24 字节，浮点数组都按 4 字节对齐，前端可以直接用 Float32Array 读取
+"""
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+MAGIC = b"PD"
+VERSION = 1
+FLAG_KEYFRAME = 0x01
+
+HEADER = struct.Struct("<2sBBIdHHI")
+
+
+def pack_frame(
+    seq: int,
+    timestamp: float,
+    width: int,
+    height: int,
+    classes: np.ndarray,
+    confidences: np.ndarray,
+    boxes: np.ndarray,
+    keyframe: Optional[bytes] = None,
+) -> bytes:
+    """把一帧的检测结果（和可选的关键帧）打包成一条二进制消息"""
+    boxes = np.ascontiguousarray(boxes, dtype="<f4").reshape(-1, 4)
+    count = len(boxes)
+    flags = FLAG_KEYFRAME if keyframe else 0
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, seq & 0xFFFFFFFF, timestamp, width, height, count),
+        boxes.tobytes(),
+        np.asarray(confidences, dtype="<f4").reshape(count).tobytes(),
+        np.asarray(classes, dtype=np.uint8).reshape(count).tobytes(),
+    ]
+    if keyframe:
+        parts.append(keyframe)
+    return b"".join(parts)
+
+
+def unpack_frame(message: bytes) -> Dict:
+    """解析 pack_frame() 生成的消息（供 Python 客户端和调试使用）"""
+    magic, version, flags, seq, timestamp, width, height, count = HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a detection stream message")
+    offset = HEADER.size
+    boxes = np.frombuffer(message, dtype="<f4", count=count * 4, offset=offset).reshape(count, 4)
+    offset += count * 16
+    confidences = np.frombuffer(message, dtype="<f4", count=count, offset=offset)
+    offset += count * 4
+    classes = np.frombuffer(message, dtype=np.uint8, count=count, offset=offset)
+    offset += count
+    return {
+        "seq": seq,
+        "timestamp": timestamp,
+        "width": width,
+        "height": height,
+        "classes": classes,
+        "confidences": confidences,
+        "boxes": boxes,
+        "keyframe": message[offset:] if flags & FLAG_KEYFRAME else None,
+    }
@@ -0,0 +1,108 @@
+"""
+切片推理
+高分辨率图片（诱虫板、叶片照片常在 4000 像素以上）整图送入模型会被缩到 640，蚂蚁、象甲等小目标随之消失。
+切片模式把图片切成相互重叠的小块，小块按原分辨率成批推理，检测框映射回原图坐标后做跨切片 NMS 去重
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+
+def tile_grid(width: int, height: int, tile_size: int, overlap: float) -> List[Tuple[int, int, int, int]]:
+    """
+    覆盖整张图片的切片坐标
+
+    Args:
+        width, height: 图片尺寸
+        tile_size: 切片边长（像素）
+        overlap: 相邻切片的重叠比例，0 ~ 0.5
+
+    Returns:
+        [(x1, y1, x2, y2), ...]，最后一行 / 列贴齐图片边缘，不产生越界切片
+    """
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height))
+        for y in starts(height)
+        for x in starts(width)
+    ]
+
+
+def pairwise_overlap(boxes: np.ndarray, metric: str = "iou") -> np.ndarray:
+    """
+    一组 xyxy 框两两之间的重叠度矩阵
+
+    metric="ios" 用交集除以较小框的面积：切片边缘截断的半个目标与另一切片中的完整目标
+    IoU 很低，但交集几乎等于半个目标的面积
+    """
+    tl = np.maximum(boxes[:, None, :2], boxes[None, :, :2])
+    br = np.minimum(boxes[:, None, 2:], boxes[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+    if metric == "ios":
+        denom = np.minimum(area[:, None], area[None, :])
+    else:
+        denom = area[:, None] + area[None, :] - inter
+    return inter / np.maximum(denom, 1e-9)
+
+
+def nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    classes: np.ndarray,
+    threshold: float = 0.5,
+    metric: str = "iou",
+) -> np.ndarray:
+    """
+    按类别的贪心 NMS，重叠度矩阵一次算出
+
+    Returns:
+        保留的下标，按置信度从高到低
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(-scores, kind="stable")
+    boxes, classes = boxes[order], classes[order]
+    # 不同类别之间不互相抑制
+    suppress = (pairwise_overlap(boxes, metric) > threshold) & (classes[:, None] == classes[None, :])
+    np.fill_diagonal(suppress, False)
+
+    keep = np.ones(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if keep[i]:
+            keep[i + 1:] &= ~suppress[i, i + 1:]
+    return order[keep]
+
+
+def merge_tiles(
+    tile_results: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+    offsets: List[Tuple[int, int]],
+    threshold: float = 0.5,
+    metric: str = "ios",
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    把各切片的检测结果映射回原图坐标并做跨切片 NMS
+
+    Args:
+        tile_results: 每个切片的 (类别编号, 置信度, xyxy 框)
+        offsets: 每个切片左上角在原图中的坐标 (x, y)
+
+    Returns:
+        (类别编号, 置信度, xyxy 框)，按置信度从高到低
+    """
+    classes = np.concatenate([np.asarray(c, dtype=np.int64).reshape(-1) for c, _, _ in tile_results])
+    scores = np.concatenate([np.asarray(s, dtype=np.float32).reshape(-1) for _, s, _ in tile_results])
+    boxes = np.concatenate([
+        np.asarray(b, dtype=np.float32).reshape(-1, 4) + np.array([x, y, x, y], dtype=np.float32)
+        for (_, _, b), (x, y) in zip(tile_results, offsets)
+    ])
+    keep = nms(boxes, scores, classes, threshold=threshold, metric=metric)
+    return classes[keep], scores[keep], boxes[keep]
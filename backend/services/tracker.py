@@ -0,0 +1,138 @@
+"""
+轻量多目标跟踪
+在稀疏采样的关键帧之间关联检测框（IoU + 匀速运动预测，NumPy 向量化），
+同一只害虫在多个关键帧中只计数一次，从而可以用更低的采样率得到准确的数量
+"""
+from typing import Dict, List
+
+import numpy as np
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组 xyxy 框的 IoU 矩阵，形状 (len(a), len(b))"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class IouTracker:
+    """
+    基于 IoU 的多目标跟踪器
+
+    每个关键帧调用一次 update()；轨迹按匀速模型预测下一帧位置后与检测框做贪心 IoU 匹配，
+    连续 max_missed 帧未匹配的轨迹结束。轨迹类别取其匹配过的检测类别中的多数。
+
+    Args:
+        num_classes: 类别数
+        iou_threshold: 预测框与检测框 IoU 不低于该值才视为同一目标
+        max_missed: 轨迹允许连续丢失的关键帧数
+        min_hits: 轨迹至少匹配多少次才计入数量（过滤偶发误检）
+        velocity_momentum: 速度平滑系数，越大越依赖历史速度
+    """
+
+    def __init__(
+        self,
+        num_classes: int,
+        iou_threshold: float = 0.2,
+        max_missed: int = 2,
+        min_hits: int = 1,
+        velocity_momentum: float = 0.5,
+    ):
+        self.num_classes = num_classes
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.min_hits = min_hits
+        self.velocity_momentum = velocity_momentum
+
+        # 活动轨迹，按行存放
+        self._boxes = np.zeros((0, 4), dtype=np.float32)
+        self._velocity = np.zeros((0, 4), dtype=np.float32)
+        self._votes = np.zeros((0, num_classes), dtype=np.int32)
+        self._missed = np.zeros(0, dtype=np.int32)
+        # 已结束且满足 min_hits 的轨迹数，按类别累计
+        self._finished = np.zeros(num_classes, dtype=np.int64)
+
+    @property
+    def active_tracks(self) -> int:
+        return len(self._boxes)
+
+    def update(self, boxes: np.ndarray, classes: np.ndarray):
+        """
+        用一个关键帧的检测结果更新轨迹
+
+        Args:
+            boxes: (N, 4) xyxy 检测框
+            classes: (N,) 类别编号
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+
+        predicted = self._boxes + self._velocity
+        matched_tracks = np.zeros(len(predicted), dtype=bool)
+        matched_dets = np.zeros(len(boxes), dtype=bool)
+
+        if len(predicted) and len(boxes):
+            iou = box_iou(predicted, boxes)
+            # 按 IoU 从大到小贪心匹配
+            rows, cols = np.nonzero(iou >= self.iou_threshold)
+            order = np.argsort(-iou[rows, cols], kind="stable")
+            track_idx, det_idx = [], []
+            for r, c in zip(rows[order], cols[order]):
+                if matched_tracks[r] or matched_dets[c]:
+                    continue
+                matched_tracks[r] = True
+                matched_dets[c] = True
+                track_idx.append(r)
+                det_idx.append(c)
+
+            if track_idx:
+                track_idx = np.asarray(track_idx)
+                det_idx = np.asarray(det_idx)
+                displacement = boxes[det_idx] - self._boxes[track_idx]
+                m = self.velocity_momentum
+                self._velocity[track_idx] = m * self._velocity[track_idx] + (1 - m) * displacement
+                self._boxes[track_idx] = boxes[det_idx]
+                self._votes[track_idx, classes[det_idx]] += 1
+
+        # 未匹配的轨迹沿预测位置继续，超过 max_missed 后结束
+        unmatched = ~matched_tracks
+        self._boxes[unmatched] = predicted[unmatched]
+        self._missed[unmatched] += 1
+        self._missed[matched_tracks] = 0
+        expired = self._missed > self.max_missed
+        if expired.any():
+            self._finish(expired)
+
+        # 未匹配的检测开启新轨迹
+        new = ~matched_dets
+        if new.any():
+            n = int(new.sum())
+            votes = np.zeros((n, self.num_classes), dtype=np.int32)
+            votes[np.arange(n), classes[new]] = 1
+            self._boxes = np.vstack([self._boxes, boxes[new]])
+            self._velocity = np.vstack([self._velocity, np.zeros((n, 4), dtype=np.float32)])
+            self._votes = np.vstack([self._votes, votes])
+            self._missed = np.concatenate([self._missed, np.zeros(n, dtype=np.int32)])
+
+    def _finish(self, mask: np.ndarray):
+        self._finished += self._confirmed_counts(self._votes[mask])
+        keep = ~mask
+        self._boxes = self._boxes[keep]
+        self._velocity = self._velocity[keep]
+        self._votes = self._votes[keep]
+        self._missed = self._missed[keep]
+
+    def _confirmed_counts(self, votes: np.ndarray) -> np.ndarray:
+        confirmed = votes.sum(axis=1) >= self.min_hits
+        return np.bincount(votes[confirmed].argmax(axis=1), minlength=self.num_classes)
+
+    def counts(self) -> np.ndarray:
+        """各类别唯一目标数（已结束 + 仍活动的轨迹）"""
+        return self._finished + self._confirmed_counts(self._votes)
+
+    def class_counts(self, class_names: List[str]) -> Dict[str, int]:
+        """各类别唯一目标数，只包含数量大于 0 的类别"""
+        return {class_names[i]: int(n) for i, n in enumerate(self.counts()) if n > 0}
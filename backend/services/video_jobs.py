@@ -0,0 +1,297 @@
+"""
+视频检测任务
+上传视频后立即返回任务 ID，视频在后台线程中处理；进度、结果写入 video_jobs 表，
+任务完成时才写入 Detection 记录。
+每个任务记录所属进程（worker_id）和心跳时间，所有状态变化都是带条件的 UPDATE：
+心跳超时的任务（所属进程已退出）由其他进程接管后重新排队或标记为失败，
+取消写入数据库后，运行该任务的进程在下一批帧处理完时停止
+"""
+import os
+import socket
+import threading
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Sequence, Union
+
+from sqlalchemy import or_, update
+
+from backend.config import settings
+from backend.database import SessionLocal
+from backend.models import Detection, VideoJob
+from backend.services.detection_objects import record_detection
+from backend.services.metrics import stage_timer, count_detections
+from backend.services.yolo_service import yolo_service
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """任务被用户取消"""
+    pass
+
+
+class _ServerShutdown(Exception):
+    """服务正在关闭，任务保留 running 状态，心跳超时后由其他进程或下次启动接管"""
+    pass
+
+
+class VideoJobManager:
+    """
+    视频任务调度器
+
+    Args:
+        max_workers: 同时处理的视频数
+        max_attempts: 每个任务最多执行次数（被接管后重新执行也计入）
+        heartbeat_interval: 刷新本进程任务心跳、检查超时任务的间隔（秒）
+        stale_after: 心跳超过该时间（秒）未更新的任务视为所属进程已退出
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_attempts: int = 2,
+        heartbeat_interval: float = 15.0,
+        stale_after: float = 60.0,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.heartbeat_interval = max(0.1, float(heartbeat_interval))
+        self.stale_after = max(self.heartbeat_interval * 2, float(stale_after))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="video-job")
+        self._cancel_events: Dict[int, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._heartbeat_thread = None
+
+    def submit(self, job_id: int):
+        """把任务放入后台线程池；任务的 worker_id 应为本进程"""
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self._pool.submit(self._run, job_id)
+
+    def cancel(self, job_id: int) -> bool:
+        """
+        通知本进程中的任务停止，正在处理的任务会在当前批次结束后停止。
+        其他进程中的任务由调用方把数据库状态改为 cancelled，见 mark_cancelled()
+
+        Returns:
+            bool: 任务是否仍在本进程中排队或运行
+        """
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def start(self):
+        """服务启动时接管超时任务，并启动心跳线程"""
+        self.recover()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="video-job-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def recover(self):
+        """
+        接管心跳超时的未完成任务（所属进程已退出）：未超过重试次数且文件仍在则在本进程重新排队，否则标记失败。
+        每个任务用带条件的 UPDATE 认领，多个进程同时检查时只有一个能接管
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.stale_after)
+        stale = or_(VideoJob.heartbeat_at.is_(None), VideoJob.heartbeat_at < cutoff)
+        db = SessionLocal()
+        try:
+            jobs = (
+                db.query(VideoJob.id, VideoJob.status, VideoJob.attempts, VideoJob.video_path)
+                .filter(VideoJob.status.in_(ACTIVE_STATUSES), stale)
+                .all()
+            )
+            requeue, failed = [], 0
+            for job_id, status, attempts, video_path in jobs:
+                if (attempts or 0) >= self.max_attempts or not os.path.exists(video_path):
+                    values = dict(status="failed", error="Interrupted by a server restart", finished_at=now)
+                else:
+                    values = dict(status="queued", frames_processed=0, worker_id=self.worker_id, heartbeat_at=now)
+                claimed = db.execute(
+                    update(VideoJob)
+                    .where(VideoJob.id == job_id, VideoJob.status == status, stale)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    continue  # 已被其他进程接管，或心跳刚刚恢复
+                if values["status"] == "queued":
+                    requeue.append(job_id)
+                else:
+                    failed += 1
+        finally:
+            db.close()
+
+        for job_id in requeue:
+            self.submit(job_id)
+        if requeue or failed:
+            logger.info(f"接管超时视频任务: 重新排队 {len(requeue)} 个, 标记失败 {failed} 个")
+
+    def shutdown(self):
+        """停止接收新任务和心跳；正在运行的任务保持 running 状态，心跳超时后被接管"""
+        self._stopping.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _heartbeat_loop(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                self._heartbeat()
+                self.recover()
+            except Exception as e:
+                logger.error(f"视频任务心跳失败: {e}")
+
+    def _heartbeat(self):
+        """刷新本进程所有排队中 / 运行中任务的心跳"""
+        db = SessionLocal()
+        try:
+            db.execute(
+                update(VideoJob)
+                .where(VideoJob.worker_id == self.worker_id, VideoJob.status.in_(ACTIVE_STATUSES))
+                .values(heartbeat_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _transition(self, db, job_id: int, from_status: Union[str, Sequence[str]], **values) -> bool:
+        """只有任务仍处于 from_status 且归本进程所有时才写入 values，返回是否写入（调用方提交）"""
+        statuses = (from_status,) if isinstance(from_status, str) else tuple(from_status)
+        result = db.execute(
+            update(VideoJob)
+            .where(VideoJob.id == job_id, VideoJob.status.in_(statuses), VideoJob.worker_id == self.worker_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    def _run(self, job_id: int):
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id) or threading.Event()
+        db = SessionLocal()
+        try:
+            job = db.query(VideoJob).filter(VideoJob.id == job_id).first()
+            if job is None:
+                return
+            user_id, video_path = job.user_id, job.video_path
+            now = datetime.utcnow()
+            if cancel_event.is_set():
+                self._transition(db, job_id, "queued", status="cancelled", finished_at=now)
+                db.commit()
+                return
+            # 认领：任务已被取消或由其他进程接管时不再执行
+            if not self._transition(
+                db, job_id, "queued",
+                status="running", attempts=VideoJob.attempts + 1, started_at=now, heartbeat_at=now,
+            ):
+                db.rollback()
+                return
+            db.commit()
+
+            def on_progress(processed, total):
+                if self._stopping.is_set():
+                    raise _ServerShutdown()
+                if cancel_event.is_set():
+                    raise JobCancelled()
+                # 进度写入同时检查数据库中的状态：其他进程处理的取消请求在这里生效
+                if not self._transition(
+                    db, job_id, "running",
+                    frames_processed=processed, frames_total=max(total, processed), heartbeat_at=datetime.utcnow(),
+                ):
+                    db.rollback()
+                    raise JobCancelled()
+                db.commit()
+
+            try:
+                class_counts = yolo_service.predict_video(video_path, on_progress=on_progress)
+            except _ServerShutdown:
+                db.rollback()
+                return
+            except JobCancelled:
+                db.rollback()
+                self._transition(db, job_id, "running", status="cancelled", finished_at=datetime.utcnow())
+                db.commit()
+                logger.info(f"视频任务 {job_id} 已取消")
+                return
+
+            # Detection 记录只在任务完成时写入，与任务状态在同一事务中提交；
+            # 任务在此期间被取消时不写入结果
+            if not self._transition(
+                db, job_id, "running",
+                status="completed", result_json=class_counts, frames_total=VideoJob.frames_processed,
+                finished_at=datetime.utcnow(),
+            ):
+                db.rollback()
+                logger.info(f"视频任务 {job_id} 已取消，丢弃结果")
+                return
+            detection = Detection(
+                user_id=user_id,
+                video_path=video_path,
+                detection_type="video",
+                result_json=class_counts,
+            )
+            db.add(detection)
+            db.flush()
+            record_detection(db, detection, class_counts=class_counts)
+            db.execute(
+                update(VideoJob).where(VideoJob.id == job_id).values(detection_id=detection.id)
+                .execution_options(synchronize_session=False)
+            )
+            with stage_timer("db_commit"):
+                db.commit()
+            count_detections(class_counts, source="video")
+        except Exception as e:
+            logger.error(f"视频任务 {job_id} 失败: {e}")
+            db.rollback()
+            self._transition(
+                db, job_id, ACTIVE_STATUSES, status="failed", error=str(e), finished_at=datetime.utcnow(),
+            )
+            db.commit()
+        finally:
+            db.close()
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+
+
+def mark_cancelled(db, job_id: int) -> bool:
+    """把未结束的任务标记为 cancelled（调用方提交），运行该任务的进程在下一批帧后停止"""
+    result = db.execute(
+        update(VideoJob)
+        .where(VideoJob.id == job_id, VideoJob.status.in_(ACTIVE_STATUSES))
+        .values(status="cancelled", finished_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def job_progress(job: VideoJob) -> Dict:
+    """根据已处理帧数和已用时间估算进度和剩余时间"""
+    if job.status == "completed":
+        return {"progress": 1.0, "eta_seconds": 0.0}
+    if not job.frames_total:
+        return {"progress": 0.0, "eta_seconds": None}
+
+    progress = min(job.frames_processed / job.frames_total, 1.0)
+    eta_seconds = None
+    if job.status == "running" and job.started_at and job.frames_processed:
+        elapsed = (datetime.utcnow() - job.started_at.replace(tzinfo=None)).total_seconds()
+        eta_seconds = elapsed / job.frames_processed * (job.frames_total - job.frames_processed)
+    return {"progress": progress, "eta_seconds": eta_seconds}
+
+
+video_job_manager = VideoJobManager(
+    max_workers=settings.VIDEO_JOB_WORKERS,
+    max_attempts=settings.VIDEO_JOB_MAX_ATTEMPTS,
+    heartbeat_interval=settings.VIDEO_JOB_HEARTBEAT_INTERVAL,
+    stale_after=settings.VIDEO_JOB_STALE_AFTER,
+)
@@ -0,0 +1,91 @@
+"""
+视频关键帧采样
+按采样帧率或时间间隔抽取视频帧：被跳过的帧只 grab()，省去 retrieve() 的颜色转换和拷贝；
+采样间隔大于关键帧间距时直接 seek 到目标帧，跳过中间帧的解码
+"""
+import logging
+from typing import Iterator, List, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class KeyframeSampler:
+    """
+    视频关键帧采样器
+
+    Args:
+        path: 视频文件路径
+        sample_fps: 每秒采样的帧数（interval 为 0 时生效）
+        interval: 采样时间间隔（秒），大于 0 时优先于 sample_fps
+        seek_min_gap: 两个采样帧相距超过该帧数时用 seek 代替逐帧 grab，0 表示从不 seek
+    """
+
+    def __init__(self, path: str, sample_fps: float = 1.0, interval: float = 0.0, seek_min_gap: int = 0):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        # 部分容器拿不到总帧数，此时为 0
+        self.total_frames = max(0, int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        step_seconds = interval if interval > 0 else 1.0 / max(sample_fps, 1e-6)
+        self.stride = max(1, int(round(step_seconds * self.fps)))
+        self.seek_min_gap = seek_min_gap
+
+        self.position = 0  # 下一次 grab/read 将得到的帧号
+        self.sampled = 0
+
+    @property
+    def expected_samples(self) -> int:
+        """预计采样帧数（总帧数未知时为 0）"""
+        if not self.total_frames:
+            return 0
+        return (self.total_frames - 1) // self.stride + 1
+
+    def _advance_to(self, target: int) -> bool:
+        gap = target - self.position
+        if self.seek_min_gap and gap > self.seek_min_gap:
+            if self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                self.position = target
+                return True
+            logger.debug(f"seek 失败，改为逐帧跳过: {self.path}")
+        for _ in range(gap):
+            if not self.cap.grab():
+                return False
+            self.position += 1
+        return True
+
+    def __iter__(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """逐个产出 (帧号, BGR 帧)"""
+        target = 0
+        try:
+            while not self.total_frames or target < self.total_frames:
+                if not self._advance_to(target):
+                    break
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                self.position += 1
+                self.sampled += 1
+                yield target, frame
+                target += self.stride
+        finally:
+            self.release()
+
+    def batches(self, batch_size: int) -> Iterator[List[Tuple[int, np.ndarray]]]:
+        """按 batch_size 成批产出采样帧，便于一次送入模型"""
+        batch = []
+        for item in self:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def release(self):
+        self.cap.release()
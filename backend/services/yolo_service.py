@@ -1,60 +1,355 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
 from backend.config import settings
+from backend.services.engines import result_arrays
+from backend.services.image_encoder import jpeg_encoder
+from backend.services.metrics import stage_timer
+from backend.services.model_registry import ModelHandle, ModelRegistry
+from backend.services.result_cache import ResultCache, make_cache_key
+from backend.services.rendering import draw_detections
+from backend.services.video_sampler import KeyframeSampler
+from backend.services.tracker import IouTracker
+from backend.services.tiling import tile_grid, merge_tiles
+import hashlib
 import os
+import logging
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+def decode_image(data):
+    """Decode encoded image bytes (jpg/png/...) into a BGR array, None if undecodable"""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def annotated_path_for(filename, key=None):
+    """Where the annotated copy of an uploaded image is written.
+
+    key (content hash / detection id) keeps uploads that share a filename from overwriting
+    each other's annotated image.
+    """
+    name = os.path.basename(filename)
+    if key:
+        name = f"{key}_{name}"
+    return os.path.join(settings.UPLOAD_DIR, "pred_" + name)
+
+def upload_path_for(filename, data):
+    """Where an uploaded original is saved, named by its content hash.
+
+    Uploads that share a filename never overwrite each other's photo; identical content shares one file.
+    """
+    name = os.path.basename(filename or "") or "upload"
+    return os.path.join(settings.UPLOAD_DIR, f"{hashlib.sha256(data).hexdigest()[:16]}_{name}")
+
+def _write_file(path, data):
+    """Write to a temp file in the same directory and rename it into place,
+    so readers never see a missing or half-written image.
+    data is bytes-like or a readable binary file object (copied in chunks)."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, f, length=1 << 20)
+            else:
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def save_bytes(path, data):
+    with stage_timer("upload_save"):
+        _write_file(path, data)
+
+def save_image(path, image):
+    """Write an annotated image; JPEG goes through the shared encoder with the "annotated" profile"""
+    with stage_timer("image_write"):
+        ext = os.path.splitext(path)[1].lower()
+        if ext in (".jpg", ".jpeg"):
+            data = jpeg_encoder.encode(image, "annotated")
+        else:
+            ok, buffer = cv2.imencode(ext or ".png", image)
+            if not ok:
+                raise ValueError(f"Cannot encode image as {ext}")
+            data = buffer.tobytes()
+        _write_file(path, data)
 
 class YoloService:
     def __init__(self):
-        self.model = YOLO(settings.MODEL_PATH)
+        # Serving model (and an optional A/B candidate), swappable at runtime via the registry
+        self.registry = ModelRegistry(ModelHandle(settings.MODEL_PATH, settings.INFERENCE_ENGINE))
+        self.cache = ResultCache(
+            max_bytes=int(settings.RESULT_CACHE_MAX_MB * 1024 * 1024),
+            disk_dir=settings.RESULT_CACHE_DIR,
+        )
         self.class_names = [
             "Ants", "Bees", "Beetles", "Caterpillars", "Earthworms", 
             "Earwigs", "Grasshoppers", "Moths", "Slugs", "Snails", 
             "Wasps", "Weevils"
         ]
 
-    def predict_image(self, image_path):
-        # Run inference
-        results = self.model(image_path)
-        
-        # Process results
-        result = results[0]
+    @property
+    def engine(self):
+        return self.registry.active.engine
+
+    @property
+    def state(self):
+        return self.registry.active.state
+
+    def load(self):
+        """Load the active model, returns False if it was already loaded"""
+        return self.registry.active.load()
+
+    def ensure_loaded(self):
+        self.registry.active.ensure_loaded()
+
+    def warmup(self, runs, imgsz=None):
+        self.registry.active.warmup(runs, imgsz=imgsz)
+
+    def startup(self):
+        """Load + warm up, called from the FastAPI lifespan hook"""
+        try:
+            self.load()
+            self.warmup(settings.MODEL_WARMUP_RUNS)
+        except Exception:
+            pass  # state / error are reported by /ready
+
+    def status(self):
+        active = self.registry.active
+        return {
+            "state": active.state,
+            "engine": active.engine.name,
+            "model_path": active.weights_path,
+            "load_seconds": active.load_seconds,
+            "warmup_seconds": active.warmup_seconds,
+            "error": active.error,
+        }
+
+    def infer(self, source, handle=None, **params):
+        """Run inference on one image path / frame through the batcher, returns one Result.
+
+        handle pins the model chosen for the surrounding request, otherwise one is routed per call.
+        """
+        with self.registry.acquire(handle) as model:
+            return model.infer(source, **params)
+
+    def infer_many(self, sources, handle=None, **params):
+        """Run inference on a list of images / frames, returns Results in the same order"""
+        with self.registry.acquire(handle) as model:
+            return model.infer_many(sources, **params)
+
+    def predict_image(self, image_path, tile_size=None, tile_overlap=None):
+        # Read from disk, then run the in-memory pipeline
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Cannot read image: {image_path}")
+        prediction = self.predict_array(image, image_path, tile_size=tile_size, tile_overlap=tile_overlap)
+        save_image(prediction["output_path"], prediction.pop("annotated"))
+        return prediction
+
+    def predict_bytes(self, data, filename, render=True, tile_size=None, tile_overlap=None):
+        """Decode uploaded bytes in memory and run inference, nothing is written to disk.
+
+        Identical image content is answered from the result cache without running the model.
+        The annotated image path is derived from the cache key, so it is shared only by uploads
+        with the same content; "annotated" is None on a hit unless that file is gone and has to be
+        redrawn from the cached boxes.
+        With render=False only the boxes are computed and "annotated" is None.
+        tile_size / tile_overlap select sliced inference, see predict_tiled().
+        The whole request runs on one model, even if the registry swaps models meanwhile.
+        """
+        tile_size, tile_overlap = self.tile_params(tile_size, tile_overlap)
+        with self.registry.acquire() as handle:
+            handle.ensure_loaded()
+            cache_key = make_cache_key(data, handle.model_version, self.cache_params(tile_size, tile_overlap, handle))
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                cached["annotated"] = None
+                if render and settings.SAVE_ANNOTATED_IMAGE and not os.path.exists(cached["output_path"]):
+                    cached["annotated"] = draw_detections(decode_image(data), cached["detections"], self.class_names)
+                return cached
+
+            with stage_timer("decode"):
+                image = decode_image(data)
+            if image is None:
+                raise ValueError("Uploaded file is not a valid image")
+            prediction = self.predict_array(
+                image, filename, render=render, tile_size=tile_size, tile_overlap=tile_overlap, handle=handle,
+                output_key=cache_key[:16],
+            )
+        self.cache.put(cache_key, {k: v for k, v in prediction.items() if k != "annotated"})
+        return prediction
+
+    def cache_params(self, tile_size=0, tile_overlap=0.0, handle=None):
+        """Inference parameters that change the result, part of the cache key"""
+        engine = (handle or self.registry.active).engine
+        params = {"engine": engine.name, "imgsz": settings.INFERENCE_IMGSZ}
+        if tile_size:
+            params.update(tile_size=tile_size, tile_overlap=tile_overlap)
+        return params
+
+    def tile_params(self, tile_size=None, tile_overlap=None):
+        """Per-request tiling parameters with the configured defaults filled in, tile_size 0 = off"""
+        if tile_size is None:
+            tile_size = settings.TILE_SIZE
+        if tile_overlap is None:
+            tile_overlap = settings.TILE_OVERLAP
+        return int(tile_size), float(tile_overlap)
+
+    def predict_array(self, image, filename, render=True, tile_size=None, tile_overlap=None, handle=None, output_key=None):
+        """Run inference on a decoded BGR image.
+
+        Images larger than tile_size (0 = never) go through predict_tiled().
+        output_key is passed to annotated_path_for() to name the annotated image.
+        Returns the annotated image under "annotated" (None when render=False);
+        writing it to "output_path" is left to the caller.
+        """
+        tile_size, tile_overlap = self.tile_params(tile_size, tile_overlap)
         
         # Generate output image with boxes
-        output_filename = "pred_" + os.path.basename(image_path)
-        output_path = os.path.join(settings.UPLOAD_DIR, output_filename)
+        output_path = annotated_path_for(filename, output_key)
         
-        # Plot results on image
-        # Ultralytics plot() returns a BGR numpy array
-        im_array = result.plot()  
-        cv2.imwrite(output_path, im_array)
-        
-        # Extract statistics
-        detections = []
-        class_counts = {}
-        
-        for box in result.boxes:
-            cls_id = int(box.cls[0])
-            conf = float(box.conf[0])
-            label = self.class_names[cls_id]
+        if tile_size and max(image.shape[:2]) > tile_size:
+            detections, class_counts = self._parse_arrays(
+                *self.predict_tiled(image, tile_size, tile_overlap, handle=handle)
+            )
+            im_array = None
+            if render:
+                with stage_timer("plot"):
+                    im_array = draw_detections(image, detections, self.class_names)
+        else:
+            # Run inference
+            result = self.infer(image, handle=handle)
             
-            detections.append({
-                "class": label,
-                "confidence": conf,
-                "box": box.xyxy[0].tolist()
-            })
+            # Plot results on image (skipped when rendering is deferred)
+            # Ultralytics plot() returns a BGR numpy array
+            im_array = None
+            if render:
+                with stage_timer("plot"):
+                    im_array = result.plot()
             
-            class_counts[label] = class_counts.get(label, 0) + 1
+            detections, class_counts = self._parse_result(result)
             
         return {
             "output_path": output_path,
+            "annotated": im_array,
             "detections": detections,
             "counts": class_counts
         }
 
+    def _parse_result(self, result):
+        """Detection dicts and per-class counts of one ultralytics Result"""
+        return self._parse_arrays(*result_arrays(result))
+
+    def _parse_arrays(self, classes, confidences, boxes):
+        """Detection dicts and per-class counts of (class ids, confidences, xyxy boxes) arrays.
+
+        The arrays are converted to Python lists in bulk instead of indexing the tensors box by box,
+        counts come from one np.bincount over all classes.
+        """
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+        detections = self.detection_dicts(classes, confidences, boxes)
+        counts = np.bincount(classes, minlength=len(self.class_names))
+        class_counts = {self.class_names[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+        return detections, class_counts
+
+    def predict_tiled(self, image, tile_size, overlap, handle=None):
+        """Sliced inference for high-resolution images.
+
+        The image is cut into overlapping tile_size tiles which go through the model together
+        at full resolution (the batcher splits them into engine-sized batches); boxes are shifted
+        back to image coordinates and merged with class-aware cross-tile NMS.
+        Returns (class ids, confidences, xyxy boxes) arrays.
+        """
+        height, width = image.shape[:2]
+        tiles = tile_grid(width, height, tile_size, overlap)
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        offsets = [(x1, y1) for x1, y1, _, _ in tiles]
+        if settings.TILE_INCLUDE_FULL:
+            # The downscaled full image recovers objects larger than a tile
+            crops.append(image)
+            offsets.append((0, 0))
+
+        with self.registry.acquire(handle) as model:
+            imgsz = tile_size if model.engine.dynamic_imgsz else settings.INFERENCE_IMGSZ
+            results = model.infer_many(crops, imgsz=imgsz)
+        return merge_tiles(
+            [result_arrays(result) for result in results],
+            offsets,
+            threshold=settings.TILE_NMS_THRESHOLD,
+            metric=settings.TILE_NMS_METRIC,
+        )
+
+    def predict_frame(self, frame, imgsz=None):
+        """Detections of one live frame as (class ids, confidences, xyxy boxes) arrays, without plotting"""
+        with self.registry.acquire() as model:
+            # Engines exported with a static shape ignore the adaptive imgsz
+            params = {"imgsz": imgsz} if imgsz and model.engine.dynamic_imgsz else {}
+            return result_arrays(model.infer(frame, **params))
+
+    def detection_dicts(self, classes, confidences, boxes):
+        """Convert (class ids, confidences, xyxy boxes) arrays to the detection dicts used for rendering"""
+        names = self.class_names
+        return [
+            {"class": names[c], "confidence": conf, "box": box}
+            for c, conf, box in zip(
+                np.asarray(classes).tolist(),
+                np.asarray(confidences).tolist(),
+                np.asarray(boxes).reshape(-1, 4).tolist(),
+            )
+        ]
+
+    def render_image(self, image_path, detections, output_path):
+        """Draw stored boxes onto the original image and write the annotated copy"""
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"Cannot read image: {image_path}")
+        with stage_timer("plot"):
+            image = draw_detections(image, detections, self.class_names)
+        save_image(output_path, image)
+        return output_path
+
+    def predict_video(self, video_path, on_progress=None):
+        """Count unique pests over sampled keyframes of a video, frames go to the model in batches.
+
+        Detections are linked across keyframes by an IoU tracker, so a pest that stays
+        on screen is counted once rather than once per sampled frame.
+        on_progress(frames_processed, frames_total) is called after every batch;
+        raising from it aborts processing (used to cancel jobs).
+        """
+        sampler = KeyframeSampler(
+            video_path,
+            sample_fps=settings.VIDEO_SAMPLE_FPS,
+            interval=settings.VIDEO_SAMPLE_INTERVAL,
+            seek_min_gap=settings.VIDEO_SEEK_MIN_GAP,
+        )
+        tracker = IouTracker(
+            num_classes=len(self.class_names),
+            iou_threshold=settings.TRACKER_IOU_THRESHOLD,
+            max_missed=settings.TRACKER_MAX_MISSED,
+            min_hits=settings.TRACKER_MIN_HITS,
+        )
+        
+        # The whole video stays on one model so the tracker sees consistent detections
+        with self.registry.acquire() as handle:
+            for batch in sampler.batches(settings.VIDEO_BATCH_SIZE):
+                results = handle.infer_many([frame for _, frame in batch])
+                
+                # Results come back in frame order
+                for result in results:
+                    boxes = result.boxes
+                    tracker.update(boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int))
+                
+                if on_progress is not None:
+                    on_progress(sampler.sampled, sampler.expected_samples)
+        
+        return tracker.class_counts(self.class_names)
+
     def predict_video_frame(self, frame):
-        results = self.model(frame)
-        result = results[0]
+        result = self.infer(frame)
         annotated_frame = result.plot()
         return annotated_frame
 
@@ -0,0 +1,94 @@
+"""
+JPEG 编码基准测试
+对比原来的编码路径（cv2.imencode 默认参数 + tobytes()）与 backend/services/image_encoder 中
+各后端、各用途 profile 的单帧耗时和输出大小
+
+用法:
+    python bench_encode.py                      # 合成画面，640x480 和 1280x720
+    python bench_encode.py --image a.jpg --frames 500
+    python bench_encode.py --sizes 1920x1080 --subsampling 444 420
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from backend.services.image_encoder import BACKENDS, JpegProfile, default_profiles
+
+
+def synthetic_frame(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """渐变背景 + 色块 + 噪声，压缩难度接近真实摄像头画面"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                      (x + y) / 2 * np.ones((height, 1), dtype=np.float32)], axis=2)
+    for _ in range(20):
+        x1, y1 = rng.integers(0, width), rng.integers(0, height)
+        color = rng.integers(0, 256, 3).tolist()
+        cv2.rectangle(frame, (int(x1), int(y1)), (int(x1) + width // 8, int(y1) + height // 8), color, -1)
+    frame += rng.normal(0, 8, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def time_it(fn, frames: int, warmup: int = 5):
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(frames):
+        data = fn()
+    elapsed = time.perf_counter() - start
+    return elapsed / frames * 1000, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JPEG encoding paths")
+    parser.add_argument("--image", help="Image to encode (default: synthetic frames)")
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1280x720"], help="WxH, used without --image")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--subsampling", nargs="+", default=None, help="Also test these subsamplings at each profile's quality")
+    args = parser.parse_args()
+
+    if args.image:
+        image = cv2.imread(args.image)
+        if image is None:
+            raise SystemExit(f"Cannot read image: {args.image}")
+        images = {f"{image.shape[1]}x{image.shape[0]}": image}
+    else:
+        images = {}
+        for size in args.sizes:
+            width, height = (int(v) for v in size.lower().split("x"))
+            images[size] = synthetic_frame(width, height)
+
+    backends = {}
+    for name, cls in BACKENDS.items():
+        try:
+            backends[name] = cls()
+        except Exception as e:
+            print(f"skip {name}: {e}")
+
+    profiles = default_profiles()
+    if args.subsampling:
+        for name, profile in list(profiles.items()):
+            for sub in args.subsampling:
+                profiles[f"{name}@{sub}"] = JpegProfile(profile.quality, sub)
+
+    header = f"{'size':>10} {'path':<28} {'quality':>7} {'sub':>5} {'ms/frame':>9} {'fps':>8} {'KB':>8} {'speedup':>8}"
+    for size, image in images.items():
+        print(header)
+        print("-" * len(header))
+        baseline_ms, baseline_len = time_it(lambda: cv2.imencode(".jpg", image)[1].tobytes(), args.frames)
+        print(f"{size:>10} {'imencode default (current)':<28} {95:>7} {'420':>5} {baseline_ms:>9.2f} "
+              f"{1000 / baseline_ms:>8.1f} {baseline_len / 1024:>8.1f} {1.0:>7.2f}x")
+        for backend_name, backend in backends.items():
+            for profile_name, profile in profiles.items():
+                ms, length = time_it(lambda: backend.encode(image, profile), args.frames)
+                label = f"{backend_name}:{profile_name}"
+                print(f"{size:>10} {label:<28} {profile.quality:>7} {profile.subsampling:>5} {ms:>9.2f} "
+                      f"{1000 / ms:>8.1f} {length / 1024:>8.1f} {baseline_ms / ms:>7.2f}x")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+检测结果后处理基准测试
+对比原来逐框处理的循环（int(box.cls[0]) / float(box.conf[0]) / box.xyxy[0].tolist()）
+与 YoloService._parse_result 的批量转换 + np.bincount，并检查两者输出一致
+
+用法:
+    python bench_postprocess.py                    # 10 / 100 / 500 / 2000 个框
+    python bench_postprocess.py --boxes 300 --repeat 200
+"""
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Boxes
+
+from backend.services.yolo_service import yolo_service
+
+
+def legacy_parse(result, class_names):
+    """原来的逐框循环"""
+    detections = []
+    class_counts = {}
+    for box in result.boxes:
+        cls_id = int(box.cls[0])
+        conf = float(box.conf[0])
+        label = class_names[cls_id]
+        detections.append({
+            "class": label,
+            "confidence": conf,
+            "box": box.xyxy[0].tolist()
+        })
+        class_counts[label] = class_counts.get(label, 0) + 1
+    return detections, class_counts
+
+
+def synthetic_result(n: int, num_classes: int, seed: int = 0):
+    """n 个随机框的 Result（只需要 .boxes）"""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 3800, (n, 2))
+    wh = rng.uniform(10, 200, (n, 2))
+    data = np.concatenate([
+        xy, xy + wh,
+        rng.uniform(0.25, 1.0, (n, 1)),
+        rng.integers(0, num_classes, (n, 1)),
+    ], axis=1).astype(np.float32)
+    return SimpleNamespace(boxes=Boxes(torch.from_numpy(data), (4000, 4000)))
+
+
+def time_it(fn, repeat: int):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection post-processing")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    class_names = yolo_service.class_names
+    print(f"{'boxes':>6} {'loop ms':>9} {'vectorized ms':>14} {'speedup':>8}")
+    for n in args.boxes:
+        result = synthetic_result(n, len(class_names))
+
+        legacy = legacy_parse(result, class_names)
+        vectorized = yolo_service._parse_result(result)
+        if legacy[0] != vectorized[0] or legacy[1] != vectorized[1]:
+            raise SystemExit(f"Output mismatch at {n} boxes")
+
+        loop_ms = time_it(lambda: legacy_parse(result, class_names), args.repeat)
+        vec_ms = time_it(lambda: yolo_service._parse_result(result), args.repeat)
+        print(f"{n:>6} {loop_ms:>9.3f} {vec_ms:>14.3f} {loop_ms / vec_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+执行数据库迁移：按模块名顺序运行 backend/migrations 下的所有迁移
+用法：python migrate_db.py
+"""
+import importlib
+import pkgutil
+
+from backend.database import engine
+import backend.migrations as migrations
+
+
+def migrate():
+    names = sorted(m.name for m in pkgutil.iter_modules(migrations.__path__) if m.name.startswith("m"))
+    for name in names:
+        module = importlib.import_module(f"backend.migrations.{name}")
+        print(f"Applying {name}...")
+        with engine.begin() as conn:
+            module.upgrade(conn)
+    print("Migrations complete.")
+
+
+if __name__ == "__main__":
+    migrate()
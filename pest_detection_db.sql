@@ -30,10 +30,36 @@ CREATE TABLE `comments`  (
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `post_id`(`post_id` ASC) USING BTREE,
   INDEX `user_id`(`user_id` ASC) USING BTREE,
+  INDEX `ix_comments_post_created`(`post_id` ASC, `created_at` ASC) USING BTREE,
   CONSTRAINT `comments_ibfk_1` FOREIGN KEY (`post_id`) REFERENCES `posts` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT,
   CONSTRAINT `comments_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 2 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for detection_objects
+-- ----------------------------
+DROP TABLE IF EXISTS `detection_objects`;
+CREATE TABLE `detection_objects`  (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `detection_id` int NOT NULL,
+  `user_id` int NULL DEFAULT NULL,
+  `class_name` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `confidence` float NULL DEFAULT NULL,
+  `x1` float NULL DEFAULT NULL,
+  `y1` float NULL DEFAULT NULL,
+  `x2` float NULL DEFAULT NULL,
+  `y2` float NULL DEFAULT NULL,
+  `created_at` datetime NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `ix_detection_objects_id`(`id` ASC) USING BTREE,
+  INDEX `ix_detection_objects_detection_id`(`detection_id` ASC) USING BTREE,
+  INDEX `ix_detection_objects_class_name`(`class_name` ASC) USING BTREE,
+  INDEX `ix_detection_objects_created_class`(`created_at` ASC, `class_name` ASC) USING BTREE,
+  INDEX `ix_detection_objects_user_class`(`user_id` ASC, `class_name` ASC) USING BTREE,
+  CONSTRAINT `detection_objects_ibfk_1` FOREIGN KEY (`detection_id`) REFERENCES `detections` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT,
+  CONSTRAINT `detection_objects_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for detections
 -- ----------------------------
@@ -44,10 +70,13 @@ CREATE TABLE `detections`  (
   `image_path` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
   `video_path` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
   `result_json` json NULL,
+  `boxes_json` json NULL,
+  `annotated_path` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
   `detection_type` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
   `created_at` datetime NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `user_id`(`user_id` ASC) USING BTREE,
+  INDEX `ix_detections_user_created`(`user_id` ASC, `created_at` ASC) USING BTREE,
   CONSTRAINT `detections_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 3 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
 
@@ -62,6 +91,7 @@ CREATE TABLE `likes`  (
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `post_id`(`post_id` ASC) USING BTREE,
   INDEX `user_id`(`user_id` ASC) USING BTREE,
+  INDEX `ix_likes_post_user`(`post_id` ASC, `user_id` ASC) USING BTREE,
   CONSTRAINT `likes_ibfk_1` FOREIGN KEY (`post_id`) REFERENCES `posts` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT,
   CONSTRAINT `likes_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 2 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
@@ -93,9 +123,33 @@ CREATE TABLE `posts`  (
   `created_at` datetime NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `user_id`(`user_id` ASC) USING BTREE,
+  INDEX `ix_posts_created`(`created_at` ASC) USING BTREE,
   CONSTRAINT `posts_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
 ) ENGINE = InnoDB AUTO_INCREMENT = 7 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for stat_counters
+-- ----------------------------
+DROP TABLE IF EXISTS `stat_counters`;
+CREATE TABLE `stat_counters`  (
+  `name` varchar(30) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `key` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `value` bigint NOT NULL,
+  PRIMARY KEY (`name`, `key`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for stat_daily
+-- ----------------------------
+DROP TABLE IF EXISTS `stat_daily`;
+CREATE TABLE `stat_daily`  (
+  `day` date NOT NULL,
+  `name` varchar(30) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `key` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `value` bigint NOT NULL,
+  PRIMARY KEY (`day`, `name`, `key`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for users
 -- ----------------------------
@@ -128,4 +182,33 @@ CREATE TABLE `verification_codes`  (
   INDEX `ix_verification_codes_email`(`email` ASC) USING BTREE
 ) ENGINE = InnoDB AUTO_INCREMENT = 9 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for video_jobs
+-- ----------------------------
+DROP TABLE IF EXISTS `video_jobs`;
+CREATE TABLE `video_jobs`  (
+  `id` int NOT NULL AUTO_INCREMENT,
+  `user_id` int NULL DEFAULT NULL,
+  `video_path` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NOT NULL,
+  `status` varchar(20) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `frames_total` int NULL DEFAULT NULL,
+  `frames_processed` int NULL DEFAULT NULL,
+  `attempts` int NULL DEFAULT NULL,
+  `result_json` json NULL,
+  `error` text CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL,
+  `detection_id` int NULL DEFAULT NULL,
+  `worker_id` varchar(64) CHARACTER SET utf8mb4 COLLATE utf8mb4_0900_ai_ci NULL DEFAULT NULL,
+  `heartbeat_at` datetime NULL DEFAULT NULL,
+  `created_at` datetime NULL DEFAULT CURRENT_TIMESTAMP,
+  `started_at` datetime NULL DEFAULT NULL,
+  `finished_at` datetime NULL DEFAULT NULL,
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `ix_video_jobs_id`(`id` ASC) USING BTREE,
+  INDEX `ix_video_jobs_user_id`(`user_id` ASC) USING BTREE,
+  INDEX `ix_video_jobs_status`(`status` ASC) USING BTREE,
+  INDEX `detection_id`(`detection_id` ASC) USING BTREE,
+  CONSTRAINT `video_jobs_ibfk_1` FOREIGN KEY (`user_id`) REFERENCES `users` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT,
+  CONSTRAINT `video_jobs_ibfk_2` FOREIGN KEY (`detection_id`) REFERENCES `detections` (`id`) ON DELETE RESTRICT ON UPDATE RESTRICT
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_0900_ai_ci ROW_FORMAT = Dynamic;
+
 SET FOREIGN_KEY_CHECKS = 1;
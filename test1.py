@@ -6,6 +6,8 @@ import math
 import random
 import tempfile
 import shutil
+import time
+import os
 
 import numpy as np
 import pandas as pd
@@ -248,14 +250,16 @@ def command_train(args):
 
 
 def command_val(args):
-    model = YOLO(args.weights)
-    res = model.val(data=args.data, split=args.split, save_json=True, project=args.project, name=args.name)
+    model = YOLO(args.weights, task='detect')
+    res = model.val(data=args.data, split=args.split, save_json=True, project=args.project, name=args.name,
+                    imgsz=getattr(args, 'imgsz', 640))
     d = dict(res.results_dict)
     out_dir = Path(args.out_directory)
     ensure_dir(out_dir)
     (out_dir / f"{args.name or 'val'}.json").write_text(json.dumps(d, indent=2))
     pd.DataFrame([d]).to_csv(out_dir / f"{args.name or 'val'}.csv", index=False)
     print(f"[OK] val results saved to {out_dir}")
+    return d
 
 
 def command_predict(args):
@@ -271,15 +275,18 @@ def command_summarize(args):
     for f in files:
         try:
             d = json.loads(f.read_text(encoding='utf-8'))
-            d['run'] = f.stem
-            box.append(d)
+            # val writes one dict per run, bench a list with one record per configuration
+            for rec in (d if isinstance(d, list) else [d]):
+                rec['run'] = f.stem
+                box.append(rec)
         except Exception as e:
             print(f"skip {f}: {e}")
     if not box:
         print("[WARN] no metrics found")
         return
     df = pd.DataFrame(box)
-    cols = ['run'] + [c for c in df.columns if any(k in c.lower() for k in ['map', 'precision', 'recall', 'f1'])]
+    keys = ['map', 'precision', 'recall', 'f1'] + list(BENCH_COLUMNS)
+    cols = ['run'] + [c for c in df.columns if any(k in c.lower() for k in keys)]
     df[cols].to_csv(args.out, index=False)
     print(f"[OK] summary written to {args.out}")
 
@@ -327,6 +334,318 @@ def command_robust(args):
 
 
 
+# Quantization
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+
+def resolve_split_images(data_yaml: str, split: str):
+    """Image files of one split in a YOLO data.yaml (directory or .txt list)"""
+    import yaml
+    base = yaml.safe_load(Path(data_yaml).read_text(encoding='utf-8'))
+    entry = base.get(split)
+    if not entry:
+        raise ValueError(f'data.yaml must contain `{split}` key')
+    root = Path(base.get('path') or Path(data_yaml).parent).resolve()
+    entries = entry if isinstance(entry, list) else [entry]
+    images = []
+    for e in entries:
+        p = Path(e) if Path(e).is_absolute() else (root / e).resolve()
+        if p.is_dir():
+            images.extend(f for f in sorted(p.rglob('*')) if f.suffix.lower() in IMAGE_EXTS)
+        elif p.suffix == '.txt':
+            images.extend(Path(line.strip()) if Path(line.strip()).is_absolute() else (root / line.strip()).resolve()
+                          for line in p.read_text(encoding='utf-8').splitlines() if line.strip())
+    return images
+
+
+def write_calibration_yaml(data_yaml: str, calib_images, out_dir: Path) -> Path:
+    """Copy of data.yaml whose `val` lists only the calibration images (exporters calibrate on `val`)"""
+    import yaml
+    base = yaml.safe_load(Path(data_yaml).read_text(encoding='utf-8'))
+    list_path = out_dir / 'calib_images.txt'
+    list_path.write_text('\n'.join(str(Path(p).resolve()) for p in calib_images) + '\n', encoding='utf-8')
+    calib_yaml = dict(base)
+    calib_yaml['path'] = str(Path(base.get('path') or Path(data_yaml).parent).resolve())
+    calib_yaml['val'] = str(list_path)
+    calib_yaml_path = out_dir / 'calib_data.yaml'
+    calib_yaml_path.write_text(yaml.safe_dump(calib_yaml), encoding='utf-8')
+    return calib_yaml_path
+
+
+def letterbox_tensor(img: np.ndarray, imgsz: int) -> np.ndarray:
+    """Same preprocessing as ultralytics (letterbox, BGR->RGB, /255, NCHW) for calibration"""
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    x = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(x[None])
+
+
+def quantize_onnx(fp32_path: Path, int8_path: Path, calib_images, imgsz: int, method: str, exclude_head: bool):
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    if method == 'dynamic':
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QUInt8)
+        return
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self, paths, input_name):
+            self.paths = iter(paths)
+            self.input_name = input_name
+
+        def get_next(self):
+            for p in self.paths:
+                img = cv2.imread(str(p))
+                if img is not None:
+                    return {self.input_name: letterbox_tensor(img, imgsz)}
+            return None
+
+    import onnx
+    graph = onnx.load(str(fp32_path)).graph
+    # The Detect head (box decoding / DFL / concat) loses most accuracy when quantized, keep it in fp32
+    exclude = [n.name for n in graph.node if n.name.startswith('/model.22/')] if exclude_head else []
+    quantize_static(
+        str(fp32_path), str(int8_path), ImageReader(calib_images, graph.input[0].name),
+        quant_format=QuantFormat.QDQ, per_channel=True,
+        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+        nodes_to_exclude=exclude,
+    )
+
+
+def measure_latency(weights: str, images, imgsz: int, warmup: int = 5):
+    """Per-image CPU latency (batch 1, preprocessing + inference + NMS)"""
+    model = YOLO(weights, task='detect')
+    frames = [img for img in (cv2.imread(str(p)) for p in images) if img is not None]
+    if not frames:
+        raise ValueError('no readable images for latency measurement')
+    for img in frames[:warmup]:
+        model.predict(img, imgsz=imgsz, device='cpu', verbose=False)
+    times = []
+    for img in frames:
+        t0 = time.perf_counter()
+        model.predict(img, imgsz=imgsz, device='cpu', verbose=False)
+        times.append((time.perf_counter() - t0) * 1000)
+    times = np.array(times)
+    return {'latency_mean_ms': float(times.mean()), 'latency_p50_ms': float(np.percentile(times, 50)),
+            'latency_p95_ms': float(np.percentile(times, 95))}
+
+
+def artifact_size_mb(p: Path) -> float:
+    files = [p] if p.is_file() else [f for f in p.rglob('*') if f.is_file()]
+    return sum(f.stat().st_size for f in files) / 1e6
+
+
+def command_quantize(args):
+    set_seed(args.seed)
+    weights = Path(args.weights)
+    out_dir = Path(args.out) if args.out else weights.parent
+    ensure_dir(out_dir)
+    # Same naming as backend/services/engines.py, so INFERENCE_ENGINE=<backend>_int8 serves the result
+    stem = f"{weights.stem}_{args.imgsz}"
+    calib = resolve_split_images(args.data, args.calib_split)
+    random.shuffle(calib)
+    calib = calib[:args.calib_images]
+    if args.calib_split == args.split:
+        print(f"[WARN] calibrating on the evaluation split `{args.split}`; the int8 accuracy will be optimistic")
+    print(f"Quantizing {weights} -> {args.backend} int8 ({args.method}), {len(calib)} calibration images")
+
+    if args.backend == 'onnx':
+        fp32_path = out_dir / f"{stem}.onnx"
+        exported = Path(YOLO(str(weights)).export(format='onnx', imgsz=args.imgsz, dynamic=True, simplify=True))
+        if exported.resolve() != fp32_path.resolve():
+            shutil.move(str(exported), str(fp32_path))
+        int8_path = out_dir / f"{stem}_int8.onnx"
+        quantize_onnx(fp32_path, int8_path, calib, args.imgsz, args.method, not args.quantize_head)
+    else:
+        if args.method != 'static':
+            raise ValueError('openvino int8 only supports static (NNCF) quantization')
+        fp32_path = out_dir / f"{stem}_openvino_model"
+        int8_path = out_dir / f"{stem}_int8_openvino_model"
+        with tempfile.TemporaryDirectory() as td:
+            # ultralytics calibrates NNCF on the `val` images of `data`; point it at the sampled
+            # --calib-split images so the evaluation split never takes part in calibration
+            calib_yaml = write_calibration_yaml(args.data, calib, Path(td))
+            for int8, target in ((False, fp32_path), (True, int8_path)):
+                exported = Path(YOLO(str(weights)).export(format='openvino', imgsz=args.imgsz, int8=int8,
+                                                          data=str(calib_yaml)))
+                if exported.resolve() != target.resolve():
+                    if target.exists():
+                        shutil.rmtree(target)
+                    shutil.move(str(exported), str(target))
+    print(f"[OK] int8 model: {int8_path}")
+
+    # Accuracy (existing val flow) and latency side by side
+    latency_images = resolve_split_images(args.data, args.split)[:args.latency_images]
+    rows = []
+    for label, path in (('fp32', fp32_path), ('int8', int8_path)):
+        val_args = argparse.Namespace(weights=str(path), data=args.data, split=args.split, project=args.project,
+                                      name=f"{args.name}_{label}", out_directory=args.out_directory, imgsz=args.imgsz)
+        d = command_val(val_args)
+        row = {'model': label, 'backend': args.backend, 'path': str(path), 'size_mb': artifact_size_mb(path)}
+        row.update({k: v for k, v in d.items() if 'map' in k.lower() or 'precision' in k.lower() or 'recall' in k.lower()})
+        row.update(measure_latency(str(path), latency_images, args.imgsz))
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    fp32, int8 = rows
+    df['speedup'] = [1.0, fp32['latency_mean_ms'] / int8['latency_mean_ms']]
+    map_key = next((k for k in df.columns if 'map50-95' in k.lower()), None)
+    if map_key:
+        df['map_drop'] = [0.0, fp32[map_key] - int8[map_key]]
+    report_dir = Path(args.project) / args.name
+    ensure_dir(report_dir)
+    df.to_csv(report_dir / 'quantize_report.csv', index=False)
+    (report_dir / 'quantize_report.json').write_text(json.dumps(df.to_dict(orient='records'), indent=2))
+    print(df.to_string(index=False))
+    print(f"[OK] report saved to {report_dir}; serve it with INFERENCE_ENGINE={args.backend}_int8")
+
+
+# Serving benchmark
+
+BENCH_COLUMNS = ('engine', 'imgsz', 'batch', 'threads', 'load_ms', 'cold_', 'warm_', 'throughput', 'rss')
+
+
+class RssSampler:
+    """Peak resident memory of this process while a benchmark configuration runs"""
+
+    def __init__(self, interval: float = 0.01):
+        import psutil
+        import threading
+        self._proc = psutil.Process()
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.peak = self._proc.memory_info().rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._proc.memory_info().rss)
+            self._stop.wait(self._interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._proc.memory_info().rss)
+
+
+def set_process_threads(threads: int):
+    """Process-wide torch / OpenCV thread counts; set before loading so the cold call runs with them"""
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+
+def apply_session_threads(model, engine, threads: int) -> bool:
+    """Limit intra-op threads of the engine itself; torch and ONNX Runtime are supported, OpenVINO keeps its own setting.
+
+    ultralytics creates the ONNX Runtime session on the first predict, so it can only be rebuilt after that call.
+    """
+    if engine.name == 'torch':
+        return True
+    backend = getattr(getattr(model, 'predictor', None), 'model', None)
+    if getattr(backend, 'onnx', False):
+        import onnxruntime as ort
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = threads
+        backend.session = ort.InferenceSession(str(engine.artifact_path()), so,
+                                               providers=backend.session.get_providers())
+        return True
+    return False
+
+
+def bench_config(engine, frames, imgsz: int, batch: int, threads: int, warmup: int, iters: int) -> dict:
+    rec = {'engine': engine.name, 'imgsz': imgsz, 'batch': batch, 'threads': threads}
+    # Thread counts are process-wide: set them before the cold measurement, not after, or it would
+    # run with the previous configuration's settings
+    set_process_threads(threads)
+    with RssSampler() as rss:
+        # cold: load + first call (graph compilation, lazy allocations)
+        t0 = time.perf_counter()
+        model = engine.load()
+        rec['load_ms'] = (time.perf_counter() - t0) * 1000
+        batches = [[frames[(i * batch + j) % len(frames)] for j in range(batch)] for i in range(warmup + iters)]
+        t0 = time.perf_counter()
+        model.predict(batches[0], imgsz=imgsz, device='cpu', verbose=False)
+        rec['cold_first_ms'] = (time.perf_counter() - t0) * 1000
+        rec['threads_applied'] = apply_session_threads(model, engine, threads)
+        # The ONNX Runtime session is rebuilt with the thread limit only after the cold call
+        rec['cold_threads_applied'] = engine.name == 'torch'
+
+        for b in batches[1:warmup]:
+            model.predict(b, imgsz=imgsz, device='cpu', verbose=False)
+        times = []
+        start = time.perf_counter()
+        for b in batches[warmup:]:
+            t0 = time.perf_counter()
+            model.predict(b, imgsz=imgsz, device='cpu', verbose=False)
+            times.append((time.perf_counter() - t0) * 1000)
+        total = time.perf_counter() - start
+    times = np.array(times)
+    rec.update({
+        'warm_latency_mean_ms': float(times.mean()),
+        'warm_latency_p50_ms': float(np.percentile(times, 50)),
+        'warm_latency_p95_ms': float(np.percentile(times, 95)),
+        'warm_latency_p99_ms': float(np.percentile(times, 99)),
+        'warm_per_image_ms': float(times.mean() / batch),
+        'throughput_ips': batch * len(times) / total,
+        'peak_rss_mb': rss.peak / 1e6,
+    })
+    return rec
+
+
+def command_bench(args):
+    # Engines (export + cache naming) are shared with the API server
+    from backend.services.engines import get_engine
+
+    src = Path(args.source)
+    paths = [src] if src.is_file() else [f for f in sorted(src.rglob('*')) if f.suffix.lower() in IMAGE_EXTS]
+    frames = [img for img in (cv2.imread(str(p)) for p in paths[:args.max_images]) if img is not None]
+    if not frames:
+        raise ValueError(f'no images found under {src}')
+    print(f"Benchmarking {args.weights} on {len(frames)} images")
+
+    records = []
+    for engine_name in args.engines:
+        for imgsz in args.imgsz:
+            engine = get_engine(engine_name, args.weights, imgsz=imgsz, cache_dir=args.cache_dir or '')
+            if engine.name != engine_name:
+                print(f"skip {engine_name}: runtime not installed")
+                break
+            for threads in args.threads:
+                for batch in args.batch:
+                    if batch > 1 and not engine.supports_batching:
+                        continue
+                    try:
+                        rec = bench_config(engine, frames, imgsz, batch, threads, args.warmup, args.iters)
+                    except Exception as e:
+                        rec = {'engine': engine_name, 'imgsz': imgsz, 'batch': batch, 'threads': threads, 'error': str(e)}
+                        print(f"[bench] {engine_name} imgsz={imgsz} batch={batch} threads={threads} failed: {e}")
+                    else:
+                        print(f"[bench] {engine_name} imgsz={imgsz} batch={batch} threads={threads} "
+                              f"{rec['throughput_ips']:.1f} img/s p50={rec['warm_latency_p50_ms']:.1f}ms "
+                              f"p99={rec['warm_latency_p99_ms']:.1f}ms cold={rec['cold_first_ms']:.0f}ms "
+                              f"rss={rec['peak_rss_mb']:.0f}MB"
+                              + ("" if rec['cold_threads_applied'] else " (cold call with default session threads)"))
+                    rec['weights'] = str(args.weights)
+                    records.append(rec)
+
+    out_dir = Path(args.out_directory)
+    ensure_dir(out_dir)
+    name = args.name or f"{Path(args.weights).parent.parent.name or Path(args.weights).stem}_bench"
+    (out_dir / f"{name}.json").write_text(json.dumps(records, indent=2))
+    pd.DataFrame(records).to_csv(out_dir / f"{name}.csv", index=False)
+    print(f"[OK] bench results saved to {out_dir / name}.csv/.json")
+
+
 def build_parser():
     p = argparse.ArgumentParser(description='YOLOv8 pipeline (精简版)')
     sub = p.add_subparsers(dest='cmd', required=True)
@@ -366,6 +685,7 @@ def build_parser():
     v.add_argument('--project', default='runs')
     v.add_argument('--name', default='val')
     v.add_argument('--out_directory', default='runs/model_result')
+    v.add_argument('--imgsz', type=int, default=640)
     v.set_defaults(func=command_val)
 
     # predict
@@ -395,6 +715,41 @@ def build_parser():
     r.add_argument('--levels', nargs='+', type=float, default=[0.0, 0.3, 0.6])
     r.set_defaults(func=command_robust)
 
+    # quantize
+    q = sub.add_parser('quantize')
+    q.add_argument('--weights', required=True)
+    q.add_argument('--data', required=True)
+    q.add_argument('--backend', default='onnx', choices=['onnx', 'openvino'])
+    q.add_argument('--method', default='static', choices=['static', 'dynamic'], help='dynamic: onnx only, no calibration')
+    q.add_argument('--imgsz', type=int, default=640)
+    q.add_argument('--calib-split', default='train', help='data.yaml split sampled for calibration')
+    q.add_argument('--calib-images', type=int, default=300)
+    q.add_argument('--quantize-head', action='store_true', help='also quantize the Detect head (onnx static)')
+    q.add_argument('--split', default='val', choices=['val', 'test'])
+    q.add_argument('--latency-images', type=int, default=100)
+    q.add_argument('--out', default=None, help='artifact directory (default: next to the weights)')
+    q.add_argument('--project', default='runs')
+    q.add_argument('--name', default='quantize')
+    q.add_argument('--out_directory', default='runs/model_result')
+    q.add_argument('--seed', type=int, default=23)
+    q.set_defaults(func=command_quantize)
+
+    # bench
+    b = sub.add_parser('bench')
+    b.add_argument('--weights', required=True)
+    b.add_argument('--source', required=True, help='image file or folder')
+    b.add_argument('--engines', nargs='+', default=['torch'], help='torch / onnx / openvino / onnx_int8 / openvino_int8')
+    b.add_argument('--imgsz', nargs='+', type=int, default=[640])
+    b.add_argument('--batch', nargs='+', type=int, default=[1])
+    b.add_argument('--threads', nargs='+', type=int, default=[os.cpu_count() or 1])
+    b.add_argument('--warmup', type=int, default=5)
+    b.add_argument('--iters', type=int, default=50)
+    b.add_argument('--max-images', type=int, default=64)
+    b.add_argument('--cache-dir', default=None, help='exported model cache (default: next to the weights)')
+    b.add_argument('--name', default=None, help='output file stem (default: <run>_bench)')
+    b.add_argument('--out_directory', default='runs/model_result')
+    b.set_defaults(func=command_bench)
+
     return p
 
 
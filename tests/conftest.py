@@ -0,0 +1,58 @@
+"""
+本地测试环境：使用临时 SQLite 数据库，无需 MySQL
+必须在导入 backend 之前设置 DATABASE_URL
+"""
+import os
+import tempfile
+from pathlib import Path
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pest_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{Path(_TMP_DIR) / 'test.db'}"
+os.environ.setdefault("UPLOAD_DIR", str(Path(_TMP_DIR) / "uploads"))
+
+import pytest
+from sqlalchemy import event
+
+from backend import models  # noqa: F401  注册所有表
+from backend.database import Base, SessionLocal, engine
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+class QueryCounter:
+    """统计同步引擎执行的 SQL 语句"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries():
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
@@ -0,0 +1,58 @@
+"""MicroBatcher 的合批：补全默认参数后，省略参数和显式传默认值的请求合并到同一批"""
+import threading
+
+from backend.services.batching import MicroBatcher
+
+
+class RecordingBatch:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, items, **params):
+        with self._lock:
+            self.calls.append((list(items), params))
+        return [(item, params["imgsz"]) for item in items]
+
+
+def submit_concurrently(batcher, submissions):
+    start = threading.Barrier(len(submissions))
+    results = [None] * len(submissions)
+
+    def run(index, item, params):
+        start.wait()
+        results[index] = batcher.submit(item, **params)
+
+    threads = [threading.Thread(target=run, args=(i, item, params)) for i, (item, params) in enumerate(submissions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_default_and_explicit_params_share_a_batch():
+    batch_fn = RecordingBatch()
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=200, default_params={"imgsz": 640})
+    submissions = [(i, {"imgsz": 640} if i % 2 else {}) for i in range(6)]
+    results = submit_concurrently(batcher, submissions)
+    batcher.close(wait=True)
+
+    assert results == [(i, 640) for i in range(6)]
+    assert len(batch_fn.calls) == 1
+    items, params = batch_fn.calls[0]
+    assert sorted(items) == list(range(6))
+    assert params == {"imgsz": 640}
+
+
+def test_different_params_do_not_split_the_batch_into_singles():
+    batch_fn = RecordingBatch()
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=200, default_params={"imgsz": 640})
+    # 两种尺寸交替到达，每种尺寸各合成一批，而不是每个请求一批
+    submissions = [(i, {"imgsz": 320} if i % 2 else {}) for i in range(8)]
+    results = submit_concurrently(batcher, submissions)
+    batcher.close(wait=True)
+
+    assert results == [(i, 320 if i % 2 else 640) for i in range(8)]
+    assert sorted(len(items) for items, _ in batch_fn.calls) == [4, 4]
+    assert batcher.qsize() == 0
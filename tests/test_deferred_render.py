@@ -0,0 +1,83 @@
+"""延迟渲染：同名的不同图片各自保存原图，/detection/{id}/annotated 在各自的原图上画框"""
+import os
+
+import cv2
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.config import settings
+from backend.dependencies import get_current_active_user, get_current_active_user_async
+from backend.models import User
+from backend.routers import detection
+from backend.services.yolo_service import annotated_path_for, yolo_service
+
+RED = (0, 0, 255)
+BLUE = (255, 0, 0)
+BOX = [2.0, 2.0, 12.0, 12.0]
+
+
+def png(color):
+    image = np.zeros((64, 64, 3), dtype=np.uint8)
+    image[:] = color
+    ok, buffer = cv2.imencode(".png", image)
+    assert ok
+    return buffer.tobytes()
+
+
+def fake_predict_bytes(data, filename, render=True, tile_size=None, tile_overlap=None):
+    # 不加载模型，只返回固定的检测框
+    return {
+        "counts": {"Ants": 1},
+        "detections": [{"class": "Ants", "confidence": 0.9, "box": BOX}],
+        "annotated": None,
+        "output_path": annotated_path_for(filename, "fake"),
+    }
+
+
+@pytest.fixture
+def users(db):
+    users = [User(username=f"render_user_{i}", hashed_password="x") for i in range(2)]
+    db.add_all(users)
+    db.commit()
+    for user in users:
+        db.refresh(user)
+        db.expunge(user)
+    return users
+
+
+@pytest.fixture
+def client(monkeypatch):
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    monkeypatch.setattr(yolo_service, "predict_bytes", fake_predict_bytes)
+    app = FastAPI()
+    app.include_router(detection.router)
+    return app, TestClient(app)
+
+
+def act_as(app, user):
+    app.dependency_overrides[get_current_active_user] = lambda: user
+    app.dependency_overrides[get_current_active_user_async] = lambda: user
+
+
+def test_same_filename_uploads_render_their_own_photo(client, users):
+    app, http = client
+    uploads = []
+    for user, color in zip(users, (RED, BLUE)):
+        act_as(app, user)
+        response = http.post(
+            "/detection/upload", params={"render": False},
+            files={"file": ("photo.png", png(color), "image/png")},
+        )
+        assert response.status_code == 200, response.text
+        uploads.append((user, color, response.json()))
+
+    assert uploads[0][2]["image_path"] != uploads[1][2]["image_path"]
+    for user, color, body in uploads:
+        act_as(app, user)
+        response = http.get(f"/detection/{body['id']}/annotated")
+        assert response.status_code == 200
+        image = cv2.imdecode(np.frombuffer(response.content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        # 框外的像素是该用户自己上传的颜色
+        assert tuple(int(v) for v in image[48, 48]) == color
@@ -0,0 +1,56 @@
+"""/forum/posts 的查询次数不随每页帖子数增长（帖子 + 作者、评论 + 评论数、点赞数，共 3 条）"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.models import Comment, Like, Post, User
+from backend.routers import forum
+
+POSTS = 120
+COMMENTS_PER_POST = 7
+EXPECTED_QUERIES = 3
+
+
+@pytest.fixture(scope="module")
+def client():
+    app = FastAPI()
+    app.include_router(forum.router)
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def seed(schema):
+    from backend.database import SessionLocal
+    db = SessionLocal()
+    users = [User(username=f"forum_user_{i}", hashed_password="x") for i in range(5)]
+    db.add_all(users)
+    db.flush()
+    for i in range(POSTS):
+        post = Post(title=f"post {i}", content="content", user_id=users[i % len(users)].id)
+        db.add(post)
+        db.flush()
+        db.add_all(
+            Comment(content=f"comment {j}", post_id=post.id, user_id=users[j % len(users)].id)
+            for j in range(COMMENTS_PER_POST)
+        )
+        db.add_all(Like(post_id=post.id, user_id=user.id) for user in users[: i % len(users) + 1])
+    db.commit()
+    db.close()
+
+
+@pytest.mark.parametrize("limit", [5, 50, 100])
+def test_posts_query_count_is_constant(client, count_queries, limit):
+    response = client.get("/forum/posts", params={"limit": limit})
+    assert response.status_code == 200
+    posts = response.json()
+    assert len(posts) == limit
+    assert count_queries.count == EXPECTED_QUERIES, count_queries.statements
+
+
+def test_posts_counts_and_latest_comments(client):
+    posts = client.get("/forum/posts", params={"limit": 10, "comments_limit": 3}).json()
+    for post in posts:
+        assert post["comments_count"] == COMMENTS_PER_POST
+        assert [c["content"] for c in post["comments"]] == [f"comment {j}" for j in range(4, 7)]
+        assert post["likes_count"] == (int(post["title"].split()[1]) % 5) + 1
+
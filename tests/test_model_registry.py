@@ -0,0 +1,66 @@
+"""ModelRegistry：加载中的候选模型不能被放弃；加载完成时已不是候选模型则释放"""
+import threading
+import time
+
+import pytest
+
+from backend.services import engines
+from backend.services.model_registry import ModelHandle, ModelRegistry
+
+
+@pytest.fixture
+def weights(tmp_path):
+    path = tmp_path / "runs" / "candidate" / "weights" / "best.pt"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"weights")
+    return str(path)
+
+
+@pytest.fixture
+def load_gate(monkeypatch):
+    gate = threading.Event()
+
+    def fake_load(self):
+        gate.wait(5)
+        return lambda sources, **params: [None] * len(sources)
+
+    monkeypatch.setattr(engines.InferenceEngine, "load", fake_load)
+    return gate
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_drop_refused_while_loading(weights, load_gate):
+    registry = ModelRegistry(ModelHandle(weights, "torch", name="active"))
+    handle = registry.load(weights, engine_name="torch")
+    assert wait_for(lambda: handle.state == "loading")
+    with pytest.raises(RuntimeError, match="still loading"):
+        registry.drop_candidate()
+
+    load_gate.set()
+    assert wait_for(lambda: handle.state == "ready")
+    assert registry.drop_candidate()
+    assert wait_for(lambda: handle.state == "retired")
+    assert handle.model is None
+
+
+@pytest.mark.parametrize("promote", [False, True])
+def test_candidate_replaced_during_load_is_released(weights, load_gate, promote):
+    active = ModelHandle(weights, "torch", name="active")
+    registry = ModelRegistry(active)
+    handle = registry.load(weights, engine_name="torch", promote=promote)
+    assert wait_for(lambda: handle.state == "loading")
+    with registry._lock:
+        registry.candidate = None
+
+    load_gate.set()
+    assert wait_for(lambda: handle.state == "retired")
+    assert handle.model is None
+    assert registry.active is active
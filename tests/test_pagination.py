@@ -0,0 +1,106 @@
+"""游标分页：created_at 由数据库默认值写入（SQLite 上同一秒、无小数部分）时也能不重不漏地翻完"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from backend.database import AsyncSessionLocal
+from backend.models import Detection, Post, User
+from backend.routers import forum
+from backend.services.pagination import NEXT_CURSOR_HEADER, keyset_query, split_page
+
+ROWS = 53
+
+
+@pytest.fixture(scope="module")
+def user(schema):
+    from backend.database import SessionLocal
+    db = SessionLocal()
+    user = User(username="pagination_user", hashed_password="x")
+    db.add(user)
+    db.flush()
+    # 大部分行使用 server_default 的时间，另一部分显式写入带微秒的时间，两种文本格式混在一起
+    now = datetime.now().replace(microsecond=0)
+    for i in range(ROWS):
+        created_at = now + timedelta(microseconds=250 * i) if i % 4 == 0 else None
+        db.add(Detection(user_id=user.id, detection_type="image", created_at=created_at))
+        db.add(Post(title=f"page {i}", content="content", user_id=user.id, created_at=created_at))
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+async def walk_history(user_id: int, limit: int):
+    """与 /detection/history 相同的查询，按游标逐页取完，返回每页的 id"""
+    pages, cursor = [], None
+    async with AsyncSessionLocal() as db:
+        while len(pages) <= ROWS:
+            query = keyset_query(
+                select(Detection).where(Detection.user_id == user_id),
+                Detection.created_at, Detection.id, limit, cursor=cursor,
+            )
+            rows, cursor = split_page(list((await db.execute(query)).scalars()), Detection.created_at, Detection.id, limit)
+            pages.append([row.id for row in rows])
+            if not cursor:
+                break
+    return pages
+
+
+async def history_offset_page(user_id: int, limit: int, page: int):
+    """第 page 页（从 1 开始）按旧的 skip 方式取"""
+    async with AsyncSessionLocal() as db:
+        query = keyset_query(
+            select(Detection).where(Detection.user_id == user_id),
+            Detection.created_at, Detection.id, limit, skip=(page - 1) * limit,
+        )
+        rows, _ = split_page(list((await db.execute(query)).scalars()), Detection.created_at, Detection.id, limit)
+        return [row.id for row in rows]
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50])
+def test_history_cursor_walks_every_row(user, limit):
+    seen = [row_id for page in asyncio.run(walk_history(user, limit)) for row_id in page]
+    assert len(seen) == len(set(seen)) == ROWS
+
+
+@pytest.mark.parametrize("limit", [7, 10])
+def test_history_cursor_matches_offset_pages(user, limit):
+    pages = asyncio.run(walk_history(user, limit))
+    assert len(pages) == -(-ROWS // limit)
+    for number, page in enumerate(pages, start=1):
+        assert page == asyncio.run(history_offset_page(user, limit, number))
+
+
+def test_posts_cursor_matches_offset_pages(user):
+    app = FastAPI()
+    app.include_router(forum.router)
+    client = TestClient(app)
+    limit = 10
+    cursor_pages, cursor = [], None
+    for _ in range(ROWS):
+        params = {"limit": limit, "comments_limit": 0}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/forum/posts", params=params)
+        assert response.status_code == 200
+        cursor_pages.append(response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+
+    for number, page in enumerate(cursor_pages, start=1):
+        response = client.get("/forum/posts", params={"limit": limit, "comments_limit": 0, "skip": (number - 1) * limit})
+        assert [post["id"] for post in response.json()] == [post["id"] for post in page]
+
+    seen = [post["id"] for page in cursor_pages for post in page if post["title"].startswith("page ")]
+    assert len(seen) == len(set(seen)) == ROWS
+
+
+def test_invalid_cursor_is_rejected():
+    client = TestClient(FastAPI())
+    client.app.include_router(forum.router)
+    assert client.get("/forum/posts", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,116 @@
+"""统计计数器的核对：只修正有偏差的行，不丢失核对期间的累加"""
+from datetime import date
+
+from sqlalchemy import select
+
+from backend.database import engine
+from backend.models import Detection, DetectionObject, StatCounter, StatDaily, User
+from backend.services import stats_counters
+from backend.services.detection_objects import record_detection
+from backend.services.stats_counters import DETECTIONS, OBJECTS, USERS
+
+
+def counters(conn):
+    table = StatCounter.__table__
+    return {(name, key): value for name, key, value in conn.execute(select(table))}
+
+
+def seed(db):
+    user = User(username="stats_user", hashed_password="x")
+    db.add(user)
+    db.flush()
+    for class_name in ("aphid", "aphid", "mite"):
+        detection = Detection(user_id=user.id, detection_type="image")
+        db.add(detection)
+        db.flush()
+        db.add(DetectionObject(detection_id=detection.id, user_id=user.id, class_name=class_name))
+    db.commit()
+    return user
+
+
+def test_reconcile_corrects_drift_without_losing_increments(db):
+    user = seed(db)
+    stats_counters.run_reconcile(engine)
+    with engine.begin() as conn:
+        before = counters(conn)
+    assert before[(OBJECTS, "aphid")] == 2
+    assert before[(OBJECTS, "mite")] == 1
+
+    with engine.begin() as conn:
+        # 人为制造偏差，并留下一个实际数据中不存在的 key
+        conn.execute(StatCounter.__table__.update().where(StatCounter.name == OBJECTS, StatCounter.key == "aphid")
+                     .values(value=10))
+        stats_counters.increment(conn, {(OBJECTS, "ghost"): 3})
+
+    with engine.begin() as conn:
+        actual, daily = stats_counters._actual_counts(conn)
+        stored = stats_counters._stored_counts(conn, StatCounter.__table__)
+        # 快照之后另一个请求累加了计数
+        stats_counters.increment(conn, {(DETECTIONS, ""): 1, (OBJECTS, "aphid"): 1})
+        changed = stats_counters._correct(conn, StatCounter.__table__, actual, stored)
+        after = counters(conn)
+
+    assert changed == 2
+    assert after[(OBJECTS, "aphid")] == 3
+    assert after[(OBJECTS, "ghost")] == 0
+    assert after[(DETECTIONS, "")] == before[(DETECTIONS, "")] + 1
+    assert after[(USERS, "")] == before[(USERS, "")]
+    assert after[(stats_counters.USER_TOTAL, str(user.id))] == 3
+
+
+def test_reconcile_is_idempotent(db):
+    stats_counters.run_reconcile(engine)
+    assert stats_counters.run_reconcile(engine) == {"counters": 0, "daily": 0}
+    with engine.begin() as conn:
+        assert stats_counters._stored_counts(conn, StatDaily.__table__)
+
+
+def test_upsert_add_fallback(monkeypatch, db):
+    monkeypatch.setattr(stats_counters, "_dialect", lambda conn: "other")
+    with engine.begin() as conn:
+        stats_counters.increment(conn, {(OBJECTS, "fallback"): 2})
+        stats_counters.increment(conn, {(OBJECTS, "fallback"): 3})
+        assert counters(conn)[(OBJECTS, "fallback")] == 5
+
+
+def test_daily_counts_follow_detection_created_at(monkeypatch, db):
+    # 应用服务器的日期与数据库不同（时区不同、零点前后）
+    class OtherDay(date):
+        @classmethod
+        def today(cls):
+            return date(2000, 1, 1)
+
+    monkeypatch.setattr(stats_counters, "date", OtherDay)
+    stats_counters.run_reconcile(engine)
+    user = db.query(User).filter_by(username="stats_user").one()
+    detection = Detection(user_id=user.id, detection_type="image")
+    db.add(detection)
+    record_detection(db, detection, class_counts={"aphid": 2})
+    db.commit()
+
+    day = detection.created_at.date()
+    with engine.begin() as conn:
+        stored = stats_counters._stored_counts(conn, StatDaily.__table__)
+    assert (date(2000, 1, 1), DETECTIONS, "") not in stored
+    assert stored[(day, OBJECTS, "aphid")] >= 2
+    assert stats_counters.run_reconcile(engine)["daily"] == 0
+    assert stats_counters.snapshot(db)["today_detections"] == stored[(stats_counters.db_today(db), DETECTIONS, "")]
+
+
+def test_snapshot_keeps_average_confidence(db):
+    stats_counters.run_reconcile(engine)
+    user = db.query(User).filter_by(username="stats_user").one()
+    for detections in (
+        [{"class": "beetle", "confidence": 0.9, "box": [0, 0, 1, 1]}, {"class": "beetle", "confidence": 0.6, "box": [0, 0, 1, 1]}],
+        None,
+    ):
+        detection = Detection(user_id=user.id, detection_type="image" if detections else "video")
+        db.add(detection)
+        record_detection(db, detection, detections=detections, class_counts={"beetle": 1, "moth": 2})
+    db.commit()
+
+    pests = {p["class"]: p for p in stats_counters.snapshot(db)["pests"]}
+    assert pests["beetle"]["count"] == 3
+    assert abs(pests["beetle"]["avg_confidence"] - 0.75) < 1e-4
+    assert pests["moth"]["avg_confidence"] is None
+    assert stats_counters.run_reconcile(engine) == {"counters": 0, "daily": 0}
@@ -0,0 +1,125 @@
+"""StreamHub：最后一个订阅者离开后马上重新订阅，不会在旧线程释放设备前再次打开同一个摄像头"""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from backend.services import stream_hub as hub_module
+from backend.services.adaptive import AdaptiveController
+from backend.services.stream_hub import WEBSOCKET, StreamHub
+
+
+class FakeCamera:
+    """同一时间只能被打开一次的摄像头"""
+
+    lock = threading.Lock()
+    open_now = 0
+    max_open = 0
+    opens = 0
+    release_gate = threading.Event()
+
+    def __init__(self, source):
+        with FakeCamera.lock:
+            FakeCamera.opens += 1
+            FakeCamera.open_now += 1
+            FakeCamera.max_open = max(FakeCamera.max_open, FakeCamera.open_now)
+            self._opened = FakeCamera.open_now == 1
+
+    def isOpened(self):
+        return self._opened
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        return 30.0
+
+    def read(self):
+        time.sleep(0.005)
+        if not self._opened:
+            return False, None
+        return True, np.zeros((48, 64, 3), dtype=np.uint8)
+
+    def release(self):
+        FakeCamera.release_gate.wait(5)
+        with FakeCamera.lock:
+            FakeCamera.open_now -= 1
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    FakeCamera.open_now = FakeCamera.max_open = FakeCamera.opens = 0
+    FakeCamera.release_gate.set()
+    monkeypatch.setattr(hub_module.cv2, "VideoCapture", FakeCamera)
+    monkeypatch.setattr(hub_module, "make_controller", lambda camera: AdaptiveController(
+        target_latency_ms=1000, target_fps=30, imgsz_ladder=[640], max_stride=1,
+    ))
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros((0, 4), dtype=np.float32))
+    monkeypatch.setattr(hub_module.yolo_service, "predict_frame", lambda frame, imgsz=None: empty)
+    hub = StreamHub(ring_size=2)
+    yield hub
+    FakeCamera.release_gate.set()
+    producers = list(hub._producers.values())
+    hub.stop_all()
+    for producer in producers:
+        producer.join(5)
+
+
+async def first_packet(subscription):
+    return await asyncio.wait_for(subscription.next(), 5)
+
+
+def test_quick_resubscribe_reuses_the_stopping_producer(hub):
+    async def scenario():
+        subscription = hub.subscribe("0", kind=WEBSOCKET)
+        assert await first_packet(subscription) is not None
+        producer = subscription.producer
+        subscription.close()
+        again = hub.subscribe("0", kind=WEBSOCKET)
+        assert await first_packet(again) is not None
+        again.close()
+        return producer, again.producer
+
+    old, new = asyncio.run(scenario())
+    assert new is old
+    assert FakeCamera.opens == 1
+
+
+def test_resubscribe_while_exiting_waits_for_the_device(hub):
+    async def scenario():
+        subscription = hub.subscribe("0", kind=WEBSOCKET)
+        assert await first_packet(subscription) is not None
+        old = subscription.producer
+        # 旧线程退出时卡在释放设备上
+        FakeCamera.release_gate.clear()
+        subscription.close()
+        for _ in range(500):
+            if old._exiting:
+                break
+            await asyncio.sleep(0.01)
+        assert old._exiting and not old.closed
+
+        again = hub.subscribe("0", kind=WEBSOCKET)
+        assert again.producer is not old
+        await asyncio.sleep(0.05)
+        FakeCamera.release_gate.set()
+        packet = await first_packet(again)
+        again.close()
+        return packet
+
+    assert asyncio.run(scenario()) is not None
+    assert FakeCamera.opens == 2
+    assert FakeCamera.max_open == 1
+
+
+def test_stopped_producer_leaves_the_registry(hub):
+    async def scenario():
+        subscription = hub.subscribe("0", kind=WEBSOCKET)
+        await first_packet(subscription)
+        subscription.close()
+        subscription.producer.join(5)
+
+    asyncio.run(scenario())
+    assert hub.viewers() == {}
@@ -0,0 +1,139 @@
+"""视频任务的所属进程、心跳接管和跨进程取消"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.database import SessionLocal
+from backend.models import Detection, User, VideoJob
+from backend.services import video_jobs
+from backend.services.video_jobs import VideoJobManager, mark_cancelled
+
+
+@pytest.fixture
+def user_id(db):
+    user = User(username=f"video_user_{datetime.utcnow().timestamp()}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"not really a video")
+    return str(path)
+
+
+@pytest.fixture
+def manager():
+    manager = VideoJobManager(max_workers=1, max_attempts=2, heartbeat_interval=1, stale_after=60)
+    manager.submitted = []
+    manager.submit = manager.submitted.append
+    yield manager
+    manager.shutdown()
+
+
+def add_job(db, user_id, video, **values):
+    job = VideoJob(user_id=user_id, video_path=video, **values)
+    db.add(job)
+    db.commit()
+    return job.id
+
+
+def load(job_id):
+    db = SessionLocal()
+    try:
+        return db.query(VideoJob).filter(VideoJob.id == job_id).first()
+    finally:
+        db.close()
+
+
+def test_recover_only_takes_over_stale_jobs(db, user_id, video, manager):
+    now = datetime.utcnow()
+    old = now - timedelta(minutes=10)
+    live = add_job(db, user_id, video, status="running", attempts=1, worker_id="sibling", heartbeat_at=now)
+    stale = add_job(db, user_id, video, status="running", attempts=1, worker_id="gone", heartbeat_at=old)
+    legacy = add_job(db, user_id, video, status="queued", attempts=0)
+    exhausted = add_job(db, user_id, video, status="running", attempts=2, worker_id="gone", heartbeat_at=old)
+
+    manager.recover()
+    assert set(manager.submitted) >= {stale, legacy}
+    assert live not in manager.submitted
+    assert load(live).worker_id == "sibling" and load(live).status == "running"
+    assert load(stale).worker_id == manager.worker_id and load(stale).status == "queued"
+    assert load(exhausted).status == "failed"
+
+    # 另一个进程随后检查时，刚接管的任务心跳是新的，不会被再次接管
+    other = VideoJobManager(max_workers=1, heartbeat_interval=1, stale_after=60)
+    other.submitted = []
+    other.submit = other.submitted.append
+    other.recover()
+    other.shutdown()
+    assert stale not in other.submitted and legacy not in other.submitted
+
+
+def run_with_fake_video(monkeypatch, manager, job_id, on_batch):
+    def fake_predict_video(path, on_progress=None):
+        for batch in range(1, 6):
+            on_progress(batch * 8, 40)
+            on_batch(batch)
+        return {"Ants": 3}
+
+    monkeypatch.setattr(video_jobs.yolo_service, "predict_video", fake_predict_video)
+    manager._run(job_id)
+
+
+def detections_for(video):
+    db = SessionLocal()
+    try:
+        return db.query(Detection).filter(Detection.video_path == video).count()
+    finally:
+        db.close()
+
+
+def cancel_elsewhere(job_id):
+    db = SessionLocal()
+    try:
+        assert mark_cancelled(db, job_id)
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_job_completes(monkeypatch, db, user_id, video, manager):
+    job_id = add_job(db, user_id, video, status="queued", worker_id=manager.worker_id)
+    run_with_fake_video(monkeypatch, manager, job_id, lambda batch: None)
+    job = load(job_id)
+    assert job.status == "completed" and job.detection_id is not None
+    assert job.frames_total == job.frames_processed == 40
+    assert job.heartbeat_at is not None
+
+
+def test_cancel_from_another_process_stops_the_job(monkeypatch, db, user_id, video, manager):
+    job_id = add_job(db, user_id, video, status="queued", worker_id=manager.worker_id)
+    batches = []
+
+    def on_batch(batch):
+        batches.append(batch)
+        if batch == 2:
+            cancel_elsewhere(job_id)
+
+    run_with_fake_video(monkeypatch, manager, job_id, on_batch)
+    assert batches == [1, 2]
+    job = load(job_id)
+    assert job.status == "cancelled" and job.detection_id is None
+    assert detections_for(video) == 0
+
+
+def test_cancel_after_last_batch_discards_the_result(monkeypatch, db, user_id, video, manager):
+    job_id = add_job(db, user_id, video, status="queued", worker_id=manager.worker_id)
+    run_with_fake_video(monkeypatch, manager, job_id, lambda batch: batch == 5 and cancel_elsewhere(job_id))
+    job = load(job_id)
+    assert job.status == "cancelled" and job.detection_id is None
+    assert detections_for(video) == 0
+
+
+def test_job_taken_over_by_another_process_is_not_run(monkeypatch, db, user_id, video, manager):
+    job_id = add_job(db, user_id, video, status="queued", worker_id="someone-else")
+    run_with_fake_video(monkeypatch, manager, job_id, lambda batch: pytest.fail("job ran twice"))
+    assert load(job_id).status == "queued"